@@ -0,0 +1,300 @@
+# Import StreamController modules
+from GtkHelper.GtkHelper import ComboRow
+from src.backend.PluginManager.ActionBase import ActionBase
+
+# Import python modules
+import json
+
+# Import gtk modules - used for the config rows
+import gi
+gi.require_version("Gtk", "4.0")
+gi.require_version("Adw", "1")
+from gi.repository import Gtk, Adw
+
+from ..backend.log_utils import log
+from ..render_state import RenderState
+
+NO_AUTH_ICON = "icons8-spotify-no-auth-100.png"
+
+class SpotifyActionBase(ActionBase):
+    """
+    Base of all Spotify actions. Reads the backend snapshot once per tick,
+    resolves auth state, target device and device label and hands them to
+    the render_key and press_key hooks of the action.
+    """
+
+    backend = None
+    # Snapshot keys this action renders
+    STATE_KEYS = ("authed",)
+    # Settings of the action and their defaults
+    SETTINGS_DEFAULTS = {
+        "device_name": None,
+        "device_id": None,
+        "show_device_label": False,
+    }
+    # Actions with a device selector target a device and can show its name
+    DEVICE_SELECTOR = True
+    rendered_version = None
+    rendered_settings = None
+    render = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backend = self.plugin_base.backend
+        self.render = RenderState(self, self.plugin_base.icons)
+        if self.DEVICE_SELECTOR:
+            self.has_configuration = True
+
+    def on_ready(self) -> None:
+        self.rendered_version = None
+        self.render.reset()
+        self.set_settings_defaults()
+        self.on_tick()
+
+    def on_tick(self) -> None:
+        self.plugin_base.keep_alive()
+        snapshot = self.plugin_base.get_snapshot()
+        settings = self.get_settings()
+        if (not self.plugin_base.has_state_changed(self.STATE_KEYS, self.rendered_version)
+                and settings == self.rendered_settings):
+            return
+        self.rendered_version = snapshot.version
+        self.rendered_settings = dict(settings)
+
+        if not snapshot.is_authed():
+            self.render.set_icon(NO_AUTH_ICON)
+            return
+
+        device_id = settings.get("device_id")
+        if self.DEVICE_SELECTOR:
+            if settings.get("show_device_label"):
+                if device_id is None:
+                    name = snapshot.get_active_device_name()
+                else:
+                    name = settings["device_name"]
+                self.render.set_label("bottom", str(name))
+            else:
+                self.render.set_label("bottom", "")
+        self.render.set_icon(self.render_key(snapshot, settings, device_id))
+
+    def on_key_down(self) -> None:
+        snapshot = self.plugin_base.get_snapshot()
+        if not snapshot.is_authed():
+            return
+        settings = self.get_settings()
+        self.press_key(snapshot, settings, settings.get("device_id"))
+
+    ### Action Hooks ###
+    def render_key(self, snapshot, settings: dict, device_id: str) -> str:
+        """
+        Render the labels of the action and return the name of its icon.
+        device_id is the selected device or None for the active device.
+        Overridden by every action, the default never fails in the tick loop.
+        """
+        return NO_AUTH_ICON
+
+    def press_key(self, snapshot, settings: dict, device_id: str) -> None:
+        """
+        Run the action on a key press while Spotify is authenticated.
+        Does nothing unless overridden by the action.
+        """
+
+    def build_config_rows(self) -> list:
+        """
+        Create the config rows of the action, the device rows already exist
+        """
+        return [self.devices_select, self.label_device_toggle]
+
+    ### Config Rows ###
+    def get_config_rows(self) -> list:
+        if not self.DEVICE_SELECTOR:
+            return []
+        if not self.backend.is_authed():
+            self.not_authed_label = Gtk.Label(label=self.plugin_base.lm.get("actions.base.not-authed"))
+            return [self.not_authed_label]
+
+        # Create Device Selector Element
+        self.devices_model = Gtk.ListStore.new([str, str])
+        self.devices_select = ComboRow(model=self.devices_model,
+                                       title=self.plugin_base.lm.get("actions.base.device-select.label"))
+
+        self.device_selector_renderer = Gtk.CellRendererText()
+        self.devices_select.combo_box.pack_start(self.device_selector_renderer, True)
+        self.devices_select.combo_box.add_attribute(self.device_selector_renderer, "text", 0)
+
+        self.label_device_toggle = Adw.SwitchRow(title=self.plugin_base.lm.get("actions.base.show-name-switch.label"),
+                                                 subtitle=self.plugin_base.lm.get("actions.base.show-name-switch.subtitle"))
+
+        self.device_select_handler = self.devices_select.combo_box.connect("changed", self.on_device_select)
+        # The selector is unrealized when the config UI of the action is closed
+        self.devices_select.connect("unrealize", self.on_device_selector_closed)
+        self.label_device_toggle.connect("notify::active", self.on_toggle_device_label)
+
+        self.set_settings_defaults()
+        self.label_device_toggle.set_active(self.get_settings().get("show_device_label", False))
+
+        rows = self.build_config_rows()
+        self.update_device_selector()
+        return rows
+
+    def set_settings_defaults(self):
+        """
+        Set the default settings for the action
+        """
+        settings = self.get_settings()
+        missing = {key: value for key, value in self.SETTINGS_DEFAULTS.items() if key not in settings}
+        if missing:
+            settings.update(missing)
+            self.set_settings(settings)
+
+    def update_device_selector(self):
+        """
+        Fill the device selector from the device cache of the backend and
+        refresh the devices in the background. The selector is filled again
+        once the refreshed device list arrives.
+        """
+        self.fill_device_selector()
+        self.plugin_base.set_devices_listener(self.fill_device_selector)
+        self.backend.refresh_devices()
+
+    def on_device_selector_closed(self, *args):
+        """
+        Stop filling the device selector once it is not shown anymore
+        """
+        self.plugin_base.clear_devices_listener(self.fill_device_selector)
+
+    def fill_device_selector(self):
+        """
+        Fill the device selector with the cached devices
+        """
+        log.debug("Updating device selector")
+        devices = json.loads(self.backend.get_cached_devices())
+
+        # Clear the model and add the currently active device
+        self.devices_select.combo_box.handler_block(self.device_select_handler)
+        self.devices_model.clear()
+        self.devices_model.append(["Currently Active", None])
+        for device in devices:
+            log.debug("Add Device: {}", device)
+            self.devices_model.append([device["name"], device["id"]])
+
+        settings = self.get_settings()
+
+        # Set index of combo box to last selected device
+        # If the device is not in the list, set it to 0 and set settings to the first device
+        log.debug("Selected device in Settings: {}", settings["device_name"])
+        if settings["device_name"] is not None:
+            self.devices_select.combo_box.set_active(self.get_index_of_id(settings["device_id"]))
+        else:
+            log.debug("Selected device not in list. Set to 0")
+            self.devices_select.combo_box.set_active(0)
+            settings["device_name"] = None
+            settings["device_id"] = None
+        self.devices_select.combo_box.handler_unblock(self.device_select_handler)
+
+        self.set_settings(settings)
+
+    def on_device_select(self, combo_box, *args):
+        """
+        Called when the user selects a device from the combo box
+        """
+        if combo_box.get_active() < 0:
+            return
+        settings = self.get_settings()
+        settings["device_name"] = self.devices_model[combo_box.get_active()][0]
+        settings["device_id"] = self.devices_model[combo_box.get_active()][1]
+        self.set_settings(settings)
+
+        log.debug("Device selected: {}", self.devices_model[combo_box.get_active()][0])
+
+    def on_toggle_device_label(self, switch, *args):
+        settings = self.get_settings()
+        settings["show_device_label"] = switch.get_active()
+        self.set_settings(settings)
+
+    def get_index_of_id(self, device_id: str) -> int:
+        """
+        Get the index of the device id within the combo box
+        """
+        if device_id is None:
+            log.debug("Device id is None => Device is the current active device")
+            return 0
+
+        for position, elem in enumerate(self.devices_model):
+            if elem[1] == device_id:
+                log.debug("Found device {} with id {}", elem[0], device_id)
+                return position
+        log.debug("Device with id {} not found, returning position {}", device_id, len(self.devices_model))
+        return len(self.devices_model)
+
+class VolumeActionBase(SpotifyActionBase):
+    """
+    Base of the actions that can show the volume of their device
+    """
+
+    # Snapshot keys this action renders
+    STATE_KEYS = ("authed", "active_device", "volume_percent", "device_volumes")
+    SETTINGS_DEFAULTS = dict(SpotifyActionBase.SETTINGS_DEFAULTS,
+                             show_vol_label=False)
+
+    def render_volume_label(self, settings: dict, volume: int) -> None:
+        if settings["show_vol_label"] == True:
+            self.render.set_label("center", str(volume))
+        else:
+            self.render.set_label("center", "")
+
+    def build_config_rows(self) -> list:
+        self.label_vol_toggle = Adw.SwitchRow(title=self.plugin_base.lm.get("actions.vol-dwn.vol-show.label"),
+                                              subtitle=self.plugin_base.lm.get("actions.vol-dwn.vol-show.subtitle"))
+        self.label_vol_toggle.connect("notify::active", self.on_toggle_track_label)
+        self.label_vol_toggle.set_active(self.get_settings().get("show_vol_label", False))
+        return [self.devices_select, self.label_device_toggle, self.label_vol_toggle]
+
+    def on_toggle_track_label(self, switch, *args):
+        settings = self.get_settings()
+        settings["show_vol_label"] = switch.get_active()
+        self.set_settings(settings)
+
+class VolumeStepActionBase(VolumeActionBase):
+    """
+    Base of the actions that change the volume by a configurable step
+    """
+
+    SETTINGS_DEFAULTS = dict(VolumeActionBase.SETTINGS_DEFAULTS,
+                             vol_chng=5)
+    # Direction of the volume step, 1 or -1
+    STEP_SIGN = 1
+    ICON = None
+    # Locale key prefix of the step config row
+    LOCALE_PREFIX = None
+
+    def render_key(self, snapshot, settings: dict, device_id: str) -> str:
+        volume = snapshot.get_volume(device_id)
+        self.render_volume_label(settings, volume)
+        if volume is None:
+            # Set icon to no sound available
+            log.debug("Volume is not available")
+            return "icons8-no-sound-100.png"
+        return self.ICON
+
+    def press_key(self, snapshot, settings: dict, device_id: str) -> None:
+        log.debug("Change volume by {}", self.STEP_SIGN * settings["vol_chng"])
+        if snapshot.get_volume(device_id) is None:
+            log.debug("Volume is not available")
+            return
+        self.plugin_base.adjust_volume(self, self.STEP_SIGN * settings["vol_chng"], device_id)
+
+    def build_config_rows(self) -> list:
+        rows = super().build_config_rows()
+        self.vol_chng = Adw.SpinRow.new_with_range(0, 100, 1)
+        self.vol_chng.set_title(self.plugin_base.lm.get(self.LOCALE_PREFIX + ".vol-spin.label"))
+        self.vol_chng.set_subtitle(self.plugin_base.lm.get(self.LOCALE_PREFIX + ".vol-spin.subtitle"))
+        self.vol_chng.connect("notify::value", self.on_toggle_volume_change)
+        self.vol_chng.set_value(self.get_settings().get("vol_chng", 5))
+        return rows + [self.vol_chng]
+
+    def on_toggle_volume_change(self, spin, *args):
+        settings = self.get_settings()
+        settings["vol_chng"] = spin.get_value()
+        self.set_settings(settings)
+        log.debug("Volume change set to {}", settings["vol_chng"])
@@ -0,0 +1,307 @@
+import asyncio, os, threading, time
+import spotipy
+from log_utils import log
+from request_governor import PRIORITY_COMMAND, PRIORITY_POLL
+from http_session import CONNECT_TIMEOUT, READ_TIMEOUT, POOL_MAXSIZE, DEVICES_PATH
+from playback_model import parse_playback
+from command_queue import CommandError, REPEAT_MODES
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Run polling, commands and token refresh on one asyncio event loop instead
+# of a thread each. Needs httpx, the threads are used if it is missing.
+ASYNC_CORE = os.environ.get("SPOTIFY_CONTROL_ASYNC_CORE") == "1"
+
+# Seconds between two checks of the token refresher schedule
+TOKEN_CHECK_INTERVAL = 30.0
+
+# Web API requests of the player commands: HTTP method, path and the query
+# parameters of the command arguments. The device id follows as last argument.
+COMMAND_REQUESTS = {
+    "shuffle": ("PUT", "me/player/shuffle", ("state",)),
+    "pause": ("PUT", "me/player/pause", ()),
+    "play": ("PUT", "me/player/play", ()),
+    "next_track": ("POST", "me/player/next", ()),
+    "previous_track": ("POST", "me/player/previous", ()),
+    "set_volume": ("PUT", "me/player/volume", ("volume_percent",)),
+    "repeat": ("PUT", "me/player/repeat", ("state",)),
+}
+
+def async_core_enabled() -> bool:
+    """
+    Check if the async core is enabled and can be used
+    """
+    if not ASYNC_CORE:
+        return False
+    if httpx is None:
+        log.warning("SPOTIFY_CONTROL_ASYNC_CORE is set but httpx is not installed, using threads")
+        return False
+    return True
+
+def query_value(value):
+    """
+    Format a command argument like spotipy does in the query
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return int(value)
+    return value
+
+class LoopEvent:
+    """
+    Wake up event of the poll scheduler on the event loop.
+    set() can be called from any thread.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def set(self) -> None:
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+class AsyncCommandQueue:
+    """
+    Sends player commands as tasks of the event loop. Commands to different
+    devices run concurrently, commands to one device keep their order.
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.device_locks = {}
+
+    def put(self, name: str, func, args: tuple, callback=None) -> None:
+        """
+        Queue a command like CommandQueue.put. The command is sent by name,
+        func is only run by the thread based queue.
+        """
+        asyncio.run_coroutine_threadsafe(self.run(name, tuple(args), callback), self.core.loop)
+
+    async def run(self, name: str, args: tuple, callback) -> None:
+        log.debug("Run command {}{}", name, args)
+        try:
+            await self.send(name, args)
+            success = True
+        except Exception as e:
+            log.error("Command {} failed: {}", name, e)
+            success = False
+
+        if callback is not None:
+            try:
+                # Rolls back the optimistic patch and pushes it, off the loop
+                await asyncio.to_thread(callback, success)
+            except Exception as e:
+                log.error("Command callback of {} failed: {}", name, e)
+
+    async def send(self, name: str, args: tuple) -> None:
+        backend = self.core.backend
+        method, path, params = COMMAND_REQUESTS[name]
+        values = args[:len(params)]
+        device_id = args[len(params)] if len(args) > len(params) else None
+        if name == "repeat" and values[0] not in REPEAT_MODES:
+            raise CommandError("Invalid repeat mode: {}".format(values[0]))
+
+        if device_id is None:
+            device_id = backend.get_active_device_id()
+        if device_id is None:   # No active Device found
+            raise CommandError("No active device found")
+
+        query = {param: query_value(value) for param, value in zip(params, values)}
+        query["device_id"] = device_id
+        # Only one request per device at a time keeps the command order
+        lock = self.device_locks.setdefault(device_id, asyncio.Lock())
+        async with lock:
+            await self.core.api_request(PRIORITY_COMMAND, name, method, path, query)
+        backend.poll_scheduler.notify_command()
+
+class AsyncCore:
+    """
+    Event loop of the backend. Runs the poll loop, the player commands and
+    the token refresh as tasks on one thread with an async HTTP client.
+    """
+
+    def __init__(self, backend, api_url: str):
+        self.backend = backend
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(base_url=api_url,
+                                        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                                        limits=httpx.Limits(max_connections=POOL_MAXSIZE))
+        self.command_queue = AsyncCommandQueue(self)
+        self.wake_event = LoopEvent(self.loop)
+        # Token expiry time of the backend and the access token read for it
+        self.access_token = None
+        # Commands and device requests wake up the poll loop
+        backend.poll_scheduler.wake_event = self.wake_event
+        self.thread = threading.Thread(target=self.run, name="async_core")
+        self.thread.daemon = True
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(asyncio.gather(self.poll_loop(), self.refresh_loop()))
+
+    ### Web API ###
+    async def api_request(self, priority: int, name: str, method: str, path: str, query: dict = None):
+        """
+        Send a Web API request through the request governor.
+        Raises SpotifyException on error responses like the spotify client,
+        returns None for a 304 Not Modified response.
+        """
+        backend = self.backend
+        governor = backend.governor
+        await governor.acquire_async(priority, governor.max_wait(priority))
+        headers = {"Authorization": "Bearer " + await self.get_access_token()}
+        conditional = method == "GET" and backend.etag_cache.get_path(path) is not None
+        if conditional:
+            etag = backend.etag_cache.get_etag(path)
+            if etag is not None:
+                headers["If-None-Match"] = etag
+        try:
+            with backend.metrics.timed("spotify_request_seconds", endpoint=name):
+                response = await self.client.request(method, path, params=query, headers=headers)
+        except httpx.HTTPError:
+            backend.record_api_error(name, "connection")
+            raise
+
+        if conditional:
+            backend.etag_cache.response(path, response.status_code, response.headers.get("ETag"))
+        if response.status_code == 304:
+            return None
+        if response.status_code >= 400:
+            backend.record_api_error(name, response.status_code)
+            error = spotipy.exceptions.SpotifyException(response.status_code, -1,
+                                                        "{}: {}".format(response.url, response.text),
+                                                        headers=dict(response.headers))
+            governor.check_rate_limit(error)
+            raise error
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def get_access_token(self) -> str:
+        """
+        Get the access token. The token cache is only read again after the
+        auth state of the backend changed or the token expired.
+        """
+        expires_at = self.backend.token_expires_at
+        if self.access_token is not None and self.access_token[0] == expires_at and expires_at > time.time():
+            return self.access_token[1]
+
+        # Reading the cache file blocks, spotipy may even refresh the token
+        token_info = await asyncio.to_thread(self.load_token_info)
+        if not token_info:
+            self.access_token = None
+            raise spotipy.exceptions.SpotifyException(401, -1, "No valid access token")
+        self.access_token = (expires_at, token_info['access_token'])
+        return token_info['access_token']
+
+    def load_token_info(self) -> dict:
+        """
+        Get the valid cached token, never starts the interactive login
+        like get_access_token of spotipy
+        """
+        auth_manager = self.backend.auth_manager
+        if auth_manager is None:
+            return None
+        return auth_manager.validate_token(auth_manager.cache_handler.get_cached_token())
+
+    ### Tasks ###
+    async def poll_loop(self) -> None:
+        """
+        Poll in the intervals given by the poll scheduler like the ticked API call.
+        Backend methods that may read the token cache or push to the plugin
+        run on worker threads, so they never hold up the commands.
+        """
+        backend = self.backend
+        while True:
+            if not backend.is_active():
+                await asyncio.to_thread(backend.idle)
+                await asyncio.sleep(1)
+                continue
+
+            if await asyncio.to_thread(backend.is_authed):
+                with backend.metrics.timed("poll_cycle_seconds"):
+                    await self.poll_once()
+            await self.wake_event.wait(backend.poll_scheduler.next_interval(backend.state_store.get().playback))
+
+    async def poll_once(self) -> None:
+        backend = self.backend
+        scheduler = backend.poll_scheduler
+        try:
+            current_playback = parse_playback(
+                await self.api_request(PRIORITY_POLL, "current_playback", "GET", "me/player"))
+            devices = backend.state_store.get().devices
+            if backend.playback_device_changed(current_playback):
+                scheduler.request_devices()
+            if scheduler.devices_due():
+                devices = backend.devices_polled(await self.api_request(PRIORITY_POLL, "devices", "GET", DEVICES_PATH))
+            await asyncio.to_thread(backend.update_state, current_playback, devices)
+        except spotipy.exceptions.SpotifyException as e:
+            # Reauthenticates on 401
+            await asyncio.to_thread(backend.handle_poll_error, e)
+        except httpx.HTTPError as e:
+            await asyncio.to_thread(backend.handle_connection_error, e)
+        except Exception as e:
+            log.error("Poll failed: {}", e)
+
+    async def refresh_loop(self) -> None:
+        """
+        Refresh the token when the token refresher schedules it
+        """
+        refresher = self.backend.token_refresher
+        while True:
+            refresh_at = refresher.next_refresh()
+            delay = TOKEN_CHECK_INTERVAL if refresh_at is None else refresh_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(min(delay, TOKEN_CHECK_INTERVAL))
+                continue
+
+            log.debug("Refresh token ahead of expiry")
+            try:
+                refresher.refresh_done(await self.refresh_token())
+            except Exception as e:
+                log.error("Token refresh failed: {}", e)
+                refresher.refresh_failed()
+
+    async def refresh_token(self) -> float:
+        """
+        Refresh the cached token like SpotifyControlBackend.refresh_token
+        """
+        backend = self.backend
+        auth_manager = backend.auth_manager
+        token_info = await asyncio.to_thread(auth_manager.cache_handler.get_cached_token) if auth_manager else None
+        if not token_info or "refresh_token" not in token_info:
+            return None
+        try:
+            with backend.metrics.timed("token_refresh_seconds"):
+                response = await self.client.post(auth_manager.OAUTH_TOKEN_URL, data={
+                    "refresh_token": token_info['refresh_token'],
+                    "grant_type": "refresh_token",
+                    "client_id": auth_manager.client_id,
+                })
+            response.raise_for_status()
+        except Exception:
+            backend.metrics.inc("token_refresh_total", result="error")
+            raise
+
+        new_token_info = response.json()
+        new_token_info['expires_at'] = int(time.time()) + new_token_info['expires_in']
+        new_token_info['scope'] = auth_manager.scope
+        new_token_info.setdefault('refresh_token', token_info['refresh_token'])
+        await asyncio.to_thread(auth_manager.cache_handler.save_token_to_cache, new_token_info)
+        expires_at = backend.token_refreshed(new_token_info)
+        self.access_token = (backend.token_expires_at, new_token_info['access_token'])
+        return expires_at
@@ -1,27 +1,82 @@
 from streamcontroller_plugin_tools import BackendBase
 
 import os
+import json
 import spotipy
+import requests
 import webbrowser
-from loguru import logger as log
+from log_utils import log
 import flask_auth as flaskApp
+from poll_scheduler import PollScheduler
+from command_queue import CommandQueue, CommandError, REPEAT_MODES
+from volume_accumulator import VolumeAccumulator
+from optimistic_state import OptimisticState
+from request_governor import RequestGovernor, PRIORITY_COMMAND, PRIORITY_POLL
+from http_session import create_session, ETagCache, DEVICES_PATH, REQUESTS_TIMEOUT
+from playback_model import parse_playback, parse_devices, SNAPSHOT_KEYS
+from rpc_utils import async_func, call_async
+from metrics import Metrics, MetricsServer
+from device_index import DeviceIndex
+from device_cache import DeviceCache
+from state_store import StateStore
+from token_refresher import TokenRefresher, AtomicCacheFileHandler
+from async_core import AsyncCore, async_core_enabled
+from rpyc.core.protocol import DEFAULT_CONFIG as RPYC_CONFIG
 import threading, time
 
-CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache")
+CACHE_PATH = os.environ.get("SPOTIFY_CONTROL_CACHE_PATH",
+                            os.path.join(os.path.dirname(__file__), ".cache"))
+
+# Web API endpoints. Can point to a local fake Web API, see fake_webapi.py
+API_URL = os.environ.get("SPOTIFY_CONTROL_API_URL", "https://api.spotify.com/v1/")
+TOKEN_URL = os.environ.get("SPOTIFY_CONTROL_TOKEN_URL", "https://accounts.spotify.com/api/token")
+
+# Local port of the Prometheus metrics endpoint, disabled if not set
+METRICS_PORT = os.environ.get("SPOTIFY_CONTROL_METRICS_PORT")
+
+# Seconds before expiry at which spotipy refreshes a token
+TOKEN_EXPIRY_MARGIN = 60
+# Seconds until a failed auth check is repeated
+AUTH_RECHECK_INTERVAL = 5
+# Seconds without a heartbeat of the plugin after which polling pauses
+ACTIVE_TIMEOUT = 5
+
+# Player commands the frontend can queue with enqueue_command
+COMMANDS = ("shuffle", "pause", "play", "next_track", "previous_track", "set_volume", "repeat")
 
 class SpotifyControlBackend(BackendBase):
 
     cache_handler = None
     auth_manager = None
     spotifyObject = None
-
-    current_playback_response = None
-    deviceList = None
+    governor = None
+    session = None
+    etag_cache = None
+    metrics = None
+    metrics_server = None
+
+    state_store = None
+    device_cache = None
+    token_refresher = None
+    async_core = None
+    state_version = 0
+    snapshot_state = None
+    snapshot_cache = None
+    snapshot_lock = None
+    frontend_state_changed = None
     action_active = False
     ticked_api_call_thread = None
     ticked_api_call_thread_started = False
+    poll_scheduler = None
+    command_queue = None
+    volume_accumulator = None
+    optimistic_state = None
     last_active_api_call = 0.0
 
+    # In-memory auth state
+    token_expires_at = 0.0
+    auth_checked_at = 0.0
+
     # User Credetials
     client_id = None
     port = None
@@ -30,23 +85,54 @@ class SpotifyControlBackend(BackendBase):
     scope = "user-read-playback-state user-modify-playback-state user-read-currently-playing app-remote-control"
 
     def __init__(self):
+        # Created first, the RPC server counts calls as soon as it runs
+        self.metrics = Metrics()
+        self.state_store = StateStore()
+        self.snapshot_lock = threading.Lock()
         super().__init__()
         log.debug("Initialize SpotifyControlBackend")
-        log.debug("Client ID: " + str(self.client_id))
-        log.debug("Port: " + str(self.port))
-
-        self.cache_handler = spotipy.cache_handler.CacheFileHandler(CACHE_PATH)
+        if self.frontend is not None:
+            # Looking up the attribute of the plugin is an RPC round trip, done once
+            self.frontend_state_changed = async_func(self.frontend.on_state_changed)
+        self.governor = RequestGovernor()
+        # Unchanged GET responses are answered with 304 Not Modified and taken from the cache
+        self.etag_cache = ETagCache(lambda result: self.metrics.inc("cache_requests_total", cache="etag", result=result))
+        self.session = create_session(self.etag_cache)
+        self.token_refresher = TokenRefresher(self.refresh_token)
+        log.debug("Client ID: {}", self.client_id)
+        log.debug("Port: {}", self.port)
+
+        self.cache_handler = AtomicCacheFileHandler(CACHE_PATH)
         if os.path.isfile(CACHE_PATH) and self.client_id and self.port:
             self.redirect_uri = "http://127.0.0.1:" + str(self.port)
             log.debug("Cache file found")
-            self.auth_manager = spotipy.oauth2.SpotifyPKCE(scope=self.scope,
-                                                    redirect_uri = self.redirect_uri,
-                                                    client_id = self.client_id,
-                                                    cache_handler=self.cache_handler,
-                                                    open_browser=True)
+            self.auth_manager = self.create_auth_manager()
             if self.auth_manager.validate_token(self.auth_manager.get_cached_token()):
-                self.spotifyObject = spotipy.Spotify(auth_manager=self.auth_manager)
+                self.spotifyObject = self.create_client()
+
+        self.poll_scheduler = PollScheduler()
+        self.device_cache = DeviceCache()
+        self.volume_accumulator = VolumeAccumulator(self.send_accumulated_volume)
+        self.optimistic_state = OptimisticState()
+
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self.get_prometheus_metrics, int(METRICS_PORT))
+                self.metrics_server.start()
+            except OSError as e:
+                log.error("Failed to start the metrics endpoint: {}", e)
+
+        if async_core_enabled():
+            # Polling, commands and token refresh run as tasks of one event loop
+            self.async_core = AsyncCore(self, API_URL)
+            self.command_queue = self.async_core.command_queue
+            self.async_core.start()
+            log.debug("Async core started")
+            return
 
+        self.command_queue = CommandQueue()
+        self.command_queue.start()
+        self.token_refresher.start()
         self.ticked_api_call_thread = threading.Thread(target=self.ticked_api_call)
         self.ticked_api_call_thread.daemon = True
         self.ticked_api_call_thread.start()
@@ -71,6 +157,72 @@ class SpotifyControlBackend(BackendBase):
         """
         return self.spotifyObject
 
+    def get_request_stats(self) -> str:
+        """
+        Get the counters of the request governor as JSON
+        """
+        return json.dumps(self.governor.get_stats())
+
+    def set_log_level(self, level: str) -> bool:
+        """
+        Set the log level of the backend at runtime
+        """
+        return log.set_level(level)
+
+    def get_log_level(self) -> str:
+        """
+        Get the log level of the backend
+        """
+        return log.get_level()
+
+    ### Metrics ###
+    def _rpyc_getattr(self, name):
+        """
+        Count the RPC calls of the frontend per backend method.
+        Access is restricted like rpyc does for public attributes.
+        """
+        if name.startswith("_") and name not in RPYC_CONFIG["safe_attrs"]:
+            raise AttributeError("access denied")
+        self.metrics.inc("rpc_calls_total", method=name)
+        return getattr(self, name)
+
+    def metric_gauges(self) -> dict:
+        """
+        Get the current values of the request governor, the state and the cache hit ratios
+        """
+        gauges = {"governor_" + key: value for key, value in self.governor.get_stats().items()}
+        gauges["state_version"] = self.state_version
+        hits = {}
+        for counter in self.metrics.to_dict()["counters"]:
+            if counter["name"] == "cache_requests_total":
+                cache = hits.setdefault(counter["labels"]["cache"], {"hit": 0, "miss": 0})
+                cache[counter["labels"]["result"]] += counter["value"]
+        for cache, results in hits.items():
+            gauges["cache_hit_ratio_" + cache] = round(results["hit"] / ((results["hit"] + results["miss"]) or 1), 4)
+        return gauges
+
+    def get_metrics(self) -> str:
+        """
+        Get the request latencies, poll cycle durations, RPC counts and
+        cache hit ratios of the backend as JSON
+        """
+        return json.dumps(self.metrics.to_dict(self.metric_gauges()))
+
+    def get_state_history(self) -> str:
+        """
+        Get the versions of the last states and the fields that changed in
+        each of them as JSON
+        """
+        history = self.state_store.get_history()
+        return json.dumps([{"version": state.version, "changed": state.diff(previous)}
+                           for previous, state in zip([None] + history[:-1], history)])
+
+    def get_prometheus_metrics(self) -> str:
+        """
+        Get the metrics of the backend in the Prometheus text format
+        """
+        return self.metrics.to_prometheus(self.metric_gauges())
+
     ### Credential Handling ###
     def update_client_credentials(self, client_id: str, port: int):
         """
@@ -91,11 +243,8 @@ class SpotifyControlBackend(BackendBase):
         """
         Setup the client
         """
-        self.auth_manager = spotipy.oauth2.SpotifyPKCE(scope=self.scope,
-                                                redirect_uri = self.redirect_uri,
-                                                client_id = self.client_id,
-                                                cache_handler=self.cache_handler,
-                                                open_browser=True)
+        self.auth_manager = self.create_auth_manager()
+        self.invalidate_auth_state()
 
         if os.path.isfile(CACHE_PATH) and self.auth_manager.validate_token(self.auth_manager.get_cached_token()):
             self.auth_manager.get_access_token(CACHE_PATH)
@@ -106,7 +255,7 @@ class SpotifyControlBackend(BackendBase):
             flaskApp.start_server(self, self.port)
             webbrowser.open_new_tab(self.auth_manager.get_authorize_url())
 
-        self.spotifyObject = spotipy.Spotify(auth_manager=self.auth_manager)
+        self.spotifyObject = self.create_client()
 
     def complete_authentication(self, token) -> bool:
         """
@@ -114,7 +263,8 @@ class SpotifyControlBackend(BackendBase):
         """
         if token:
             self.auth_manager.get_access_token(token)
-            self.spotifyObject = spotipy.Spotify(auth_manager=self.auth_manager)
+            self.spotifyObject = self.create_client()
+            self.invalidate_auth_state()
             return True
         return False
 
@@ -128,75 +278,400 @@ class SpotifyControlBackend(BackendBase):
         self.client_id = client_id
         self.port = int(port)
         self.redirect_uri = "http://127.0.0.1:" + str(self.port)
+        self.invalidate_auth_state()
 
         if not os.path.isfile(CACHE_PATH):
             log.debug("Cache file not found")
             return False
 
-        self.cache_handler = spotipy.cache_handler.CacheFileHandler(CACHE_PATH)
-        self.auth_manager = spotipy.oauth2.SpotifyPKCE(scope=self.scope,
-                                                redirect_uri = self.redirect_uri,
-                                                client_id = self.client_id,
-                                                cache_handler=self.cache_handler,
-                                                open_browser=True)
+        self.cache_handler = AtomicCacheFileHandler(CACHE_PATH)
+        self.auth_manager = self.create_auth_manager()
 
         if not self.auth_manager.validate_token(self.auth_manager.get_cached_token()):
             log.debug("Token is not valid")
             return False
 
         self.auth_manager.get_access_token(CACHE_PATH)
-        self.spotifyObject = spotipy.Spotify(auth_manager=self.auth_manager)
+        self.spotifyObject = self.create_client()
 
         return True
 
     ### WebAPI Access functions ###
+    def create_auth_manager(self) -> spotipy.oauth2.SpotifyPKCE:
+        """
+        Create the PKCE auth manager on the shared HTTP session
+        """
+        auth_manager = spotipy.oauth2.SpotifyPKCE(scope=self.scope,
+                                                  redirect_uri = self.redirect_uri,
+                                                  client_id = self.client_id,
+                                                  cache_handler=self.cache_handler,
+                                                  open_browser=True,
+                                                  requests_session=self.session,
+                                                  requests_timeout=REQUESTS_TIMEOUT)
+        auth_manager.OAUTH_TOKEN_URL = TOKEN_URL
+        return auth_manager
+
+    def create_client(self) -> spotipy.Spotify:
+        """
+        Create the spotify client on the shared HTTP session. Retries are
+        disabled, rate limits are handled by the request governor.
+        """
+        client = spotipy.Spotify(auth_manager=self.auth_manager,
+                                 requests_session=self.session,
+                                 requests_timeout=REQUESTS_TIMEOUT,
+                                 retries=0, status_retries=0)
+        client.prefix = API_URL
+        return client
+
+    def api_call(self, priority: int, method: str, *args, **kwargs):
+        """
+        Call a method of the spotify client through the request governor
+        """
+        func = getattr(self.spotifyObject, method)
+
+        def timed_call(*args, **kwargs):
+            with self.metrics.timed("spotify_request_seconds", endpoint=method):
+                return func(*args, **kwargs)
+
+        try:
+            return self.governor.call(priority, timed_call, *args, **kwargs)
+        except spotipy.exceptions.SpotifyException as e:
+            self.record_api_error(method, e.http_status)
+            raise
+        except requests.exceptions.RequestException:
+            self.record_api_error(method, "connection")
+            raise
+
+    def record_api_error(self, method: str, status) -> None:
+        """
+        Count a failed Web API request
+        """
+        self.metrics.inc("spotify_request_errors_total", endpoint=method, status=status)
+        if status == 429:
+            self.metrics.inc("spotify_rate_limited_total")
+
     def ticked_api_call(self):
         """
-        Call the Spotify API every 1 second
+        Call the Spotify API in the intervals given by the poll scheduler
         """
         self.ticked_api_call_thread_started = True
         while True:
 
-            log.debug("Ticked API call")
-            while time.time() - self.last_active_api_call > 5:
+            log.sampled("ticked_api_call", "Ticked API call")
+            while not self.is_active():
                 # Wait for action on ticked API call
-                self.current_playback_response = None
+                self.idle()
                 time.sleep(1)
 
-            if self.is_authed():
-                try:
-                    self.current_playback_response = self.spotifyObject.current_playback()
-                    log.debug("Current playback: " + str(self.current_playback_response))
-                    self.deviceList= self.spotifyObject.devices()
-                    log.debug("Devices: " + str(self.deviceList))
-                except spotipy.exceptions.SpotifyException as e:
-                    log.error("Error updating spotify data: " + str(e))
-                    if e.http_status == 401 or e.http_status == 403:
-                        log.error("Spotify token is not valid. Reauthenticating...")
-                        self.current_playback_response = None
-                        self.deviceList = None
-                        self.reauthenticate(self.client_id, self.port)
-                    elif e.http_status == 404:
-                        log.error("Spotify API not found. Check your client ID and port.")
-                        self.current_playback_response = None
-                        self.deviceList = None
-                    elif e.http_status == 429:
-                        log.error("Spotify API rate limit exceeded. Waiting before retrying...")
-                        time.sleep(int(e.headers.get('Retry-After', 1)))
-                    else:
-                        log.error("Spotify API error: " + str(e))
-                        self.current_playback_response = None
-                        self.deviceList = None
-            time.sleep(1)
+            self.poll()
+            self.poll_scheduler.wait(self.poll_scheduler.next_interval(self.state_store.get().playback))
+
+    def is_active(self) -> bool:
+        """
+        Check if the plugin sent a heartbeat within ACTIVE_TIMEOUT
+        """
+        return time.time() - self.last_active_api_call <= ACTIVE_TIMEOUT
+
+    def idle(self) -> None:
+        """
+        Clear the playback while polling is paused and poll the devices
+        once polling resumes
+        """
+        state = self.state_store.get()
+        if state.playback is not None:
+            self.update_state(None, state.devices)
+            self.poll_scheduler.request_devices()
+
+    def poll(self) -> None:
+        """
+        Poll the playback state and, if due, the device list once
+        """
+        if not self.is_authed():
+            return
+        with self.metrics.timed("poll_cycle_seconds"):
+            self.poll_once()
+
+    def poll_once(self) -> None:
+        """
+        Request the playback state and devices and handle Web API errors
+        """
+        try:
+            current_playback = parse_playback(self.api_call(PRIORITY_POLL, "current_playback"))
+            log.sampled("current_playback", "Current playback: {}", current_playback)
+            devices = self.state_store.get().devices
+            if self.playback_device_changed(current_playback):
+                self.poll_scheduler.request_devices()
+            if self.poll_scheduler.devices_due():
+                devices = self.devices_polled(self.api_call(PRIORITY_POLL, "devices"))
+            self.update_state(current_playback, devices)
+        except spotipy.exceptions.SpotifyException as e:
+            self.handle_poll_error(e)
+        except requests.exceptions.RequestException as e:
+            self.handle_connection_error(e)
+
+    def devices_polled(self, response: dict) -> list:
+        """
+        Get the devices of a devices response. A 304 Not Modified response
+        returns the unchanged list of the last poll.
+        """
+        devices = self.etag_cache.parse(DEVICES_PATH, response, parse_devices)
+        log.debug("Devices: {}", devices)
+        self.device_cache.update(devices)
+        self.poll_scheduler.devices_polled()
+        return devices
+
+    def handle_poll_error(self, e: spotipy.exceptions.SpotifyException) -> None:
+        """
+        Reset or reauthenticate after a failed poll
+        """
+        log.error("Error updating spotify data: {}", e)
+        self.poll_scheduler.request_devices()
+        if e.http_status == 401 or e.http_status == 403:
+            log.error("Spotify token is not valid. Reauthenticating...")
+            self.invalidate_auth_state()
+            self.update_state(None, None)
+            self.reauthenticate(self.client_id, self.port)
+        elif e.http_status == 404:
+            log.error("Spotify API not found. Check your client ID and port.")
+            self.update_state(None, None)
+        elif e.http_status == 429:
+            # The request governor holds back all requests until Retry-After passed
+            log.error("Spotify API rate limit exceeded. Waiting before retrying...")
+        else:
+            log.error("Spotify API error: {}", e)
+            self.update_state(None, None)
+
+    def handle_connection_error(self, e: Exception) -> None:
+        """
+        Poll the devices again after the Web API was not reachable
+        """
+        log.error("Error connecting to the Spotify API: {}", e)
+        self.poll_scheduler.request_devices()
+
+    def playback_device_changed(self, current_playback) -> bool:
+        """
+        Check if the playback moved to another device than the active one
+        of the known device list
+        """
+        if current_playback is None or current_playback.device is None:
+            return False
+        return current_playback.device.id != self.get_active_device_id()
+
+    def update_state(self, current_playback, devices):
+        """
+        Swap in the new playback and device data and push the changes to the frontend
+        """
+        def apply(state):
+            if devices is not state.devices:
+                # Only rebuilt for a new devices response
+                device_index = DeviceIndex(devices)
+                for device in device_index.devices:
+                    self.volume_accumulator.reconcile(device.id, device.volume_percent)
+            else:
+                device_index = state.device_index
+            if current_playback is not None and current_playback.device is not None:
+                # The playback device is polled more often than the device list
+                device = current_playback.device
+                if device_index is state.device_index:
+                    device_index = device_index.copy()
+                device_index.update_volume(device.id, device.volume_percent, device.supports_volume)
+                self.volume_accumulator.reconcile(device.id, device.volume_percent)
+            return state.replace(playback=self.optimistic_state.reconcile(current_playback),
+                                 polled_playback=current_playback,
+                                 devices=devices,
+                                 device_index=device_index)
+
+        self.state_store.update(apply)
+        self.refresh_snapshot(self.is_authed())
+
+    def build_snapshot(self, authed: bool) -> dict:
+        """
+        Build the snapshot of auth status, playback, devices and volume
+        """
+        snapshot = {
+            "version": self.state_version,
+            "authed": authed,
+            "active_device": None,
+            "devices": [],
+            "is_playing": None,
+            "shuffle_state": None,
+            "repeat_state": None,
+            "volume_percent": None,
+            "device_volumes": {},
+        }
+        if not authed:
+            return snapshot
+
+        # One consistent state for the whole snapshot
+        state = self.state_store.get()
+        devices = state.device_index.devices
+        snapshot["devices"] = [{
+            "id": device.id,
+            "name": device.name,
+            "is_active": device.is_active,
+        } for device in devices]
+        snapshot["device_volumes"] = {device.id: self.read_volume(state, device.id) for device in devices}
+        active_device_id = state.get_active_device_id()
+        if active_device_id is None:
+            return snapshot
+
+        snapshot["active_device"] = {
+            "id": active_device_id,
+            "name": state.device_index.get_active_device_name(),
+        }
+        curPlayback = state.playback
+        if curPlayback is not None:
+            snapshot["is_playing"] = curPlayback.is_playing
+            snapshot["shuffle_state"] = curPlayback.shuffle_state
+            snapshot["repeat_state"] = curPlayback.repeat_state
+            snapshot["volume_percent"] = self.read_volume(state, active_device_id)
+        return snapshot
+
+    def refresh_snapshot(self, authed: bool) -> None:
+        """
+        Rebuild the snapshot, bump the version and push the changed keys
+        to the frontend if anything changed since the last snapshot
+        """
+        with self.snapshot_lock:
+            snapshot = self.build_snapshot(authed)
+            previous = self.snapshot_state or {}
+            changed = tuple(key for key in SNAPSHOT_KEYS if snapshot[key] != previous.get(key))
+            if self.snapshot_state is not None and not changed:
+                return
+
+            self.state_version += 1
+            snapshot["version"] = self.state_version
+            self.snapshot_state = snapshot
+            self.snapshot_cache = json.dumps(snapshot)
+        self.push_state_change(snapshot["version"], changed)
+
+    def push_state_change(self, version: int, changed: tuple) -> None:
+        """
+        Notify the frontend about the keys changed in the given snapshot version
+        """
+        if self.frontend_state_changed is None:
+            return
+        log.debug("Push state change {}: {}", version, changed)
+        try:
+            # Not waited for, a lost push is covered by the snapshot max age of the plugin
+            self.frontend_state_changed(version, changed)
+        except Exception as e:
+            log.error("Failed to push state change: {}", e)
+
+    def get_snapshot(self) -> str:
+        """
+        Get a versioned snapshot of auth status, playback, devices and volume.
+        The snapshot is serialized to JSON so it is copied by value over RPC
+        instead of being proxied key by key.
+        """
+        self.last_active_api_call = time.time()
+
+        authed = self.is_authed()
+        if self.snapshot_state is None or self.snapshot_state["authed"] != authed:
+            self.metrics.inc("cache_requests_total", cache="snapshot", result="miss")
+            self.refresh_snapshot(authed)
+        else:
+            self.metrics.inc("cache_requests_total", cache="snapshot", result="hit")
+        return self.snapshot_cache
 
     def set_action_active(self, active: bool):
         """
-        Set the action active
+        Heartbeat of the plugin while Spotify keys are shown.
+        Keeps the ticked API call polling.
         """
-        log.debug("Set action active: " + str(active))
+        log.sampled("set_action_active", "Set action active: {}", active)
         self.last_active_api_call = time.time()
 
     ### Player Control ###
+    def enqueue_command(self, command: str, args: tuple = (), callback=None) -> bool:
+        """
+        Queue a player command and return immediately.
+        The callback is called with the success of the command once it ran.
+        """
+        if command not in COMMANDS:
+            log.error("Unknown command: {}", command)
+            return False
+        args = tuple(args)
+        # Patched before queueing, so a fast failing command can not roll back before the patch
+        self.patch_playback(command, args)
+        self.command_queue.put(command, getattr(self, command), args,
+                               self.command_done_callback(command, args, callback))
+        return True
+
+    def command_done_callback(self, command: str, args: tuple, callback=None):
+        """
+        Get a callback that rolls back the optimistic patch of a failed command
+        and then calls the callback of the frontend
+        """
+        def on_command_done(success: bool):
+            if not success:
+                self.rollback_playback(command, args)
+            if callback is not None:
+                # The plugin only serves the connection while it calls the
+                # backend itself, waiting for it would stall the command queue
+                call_async(callback, success)
+        return on_command_done
+
+    def optimistic_patch(self, command: str, args: tuple):
+        """
+        Get the playback key, value and target device a command changes,
+        None if the command changes nothing or its value is invalid
+        """
+        if command == "shuffle" and isinstance(args[0], bool):
+            return 'shuffle_state', args[0], args[1] if len(args) > 1 else None
+        if command == "repeat" and args[0] in REPEAT_MODES:
+            return 'repeat_state', args[0], args[1]
+        if command == "pause":
+            return 'is_playing', False, args[0]
+        if command == "play":
+            return 'is_playing', True, args[0]
+        if command == "set_volume" and isinstance(args[0], (int, float)) and 0 <= args[0] <= 100:
+            return 'volume_percent', int(args[0]), args[1]
+        return None
+
+    def patch_playback(self, command: str, args: tuple) -> None:
+        """
+        Apply a queued command to the cached playback state right away.
+        The next poll confirms or rolls back the patched value.
+        """
+        patch = self.optimistic_patch(command, args)
+        if patch is None:
+            return
+        key, value, device_id = patch
+
+        if key == 'volume_percent':
+            if device_id is None:
+                device_id = self.get_active_device_id()
+            if device_id is None:
+                return
+            self.volume_accumulator.hold(device_id, value)
+        else:
+            def apply(state):
+                if device_id is not None and device_id != state.get_active_device_id():
+                    # The playback state only covers the active device
+                    return None
+                return state.replace(playback=self.optimistic_state.patch(state.playback, key, value))
+
+            self.state_store.update(apply)
+        self.refresh_snapshot(self.is_authed())
+
+    def rollback_playback(self, command: str, args: tuple) -> None:
+        """
+        Roll back the optimistic patch of a failed command
+        """
+        patch = self.optimistic_patch(command, args)
+        if patch is None:
+            return
+        key, value, device_id = patch
+
+        if key == 'volume_percent':
+            self.volume_accumulator.drop(device_id or self.get_active_device_id())
+        else:
+            self.optimistic_state.drop(key)
+            self.state_store.update(lambda state: state.replace(
+                playback=self.optimistic_state.reconcile(state.polled_playback)))
+        self.refresh_snapshot(self.is_authed())
+
     def get_devices(self):
         """
         Get the list of devices
@@ -205,72 +680,124 @@ class SpotifyControlBackend(BackendBase):
             log.debug("Spotify is not authenticated")
             return None
 
-        if self.deviceList is None:
+        state = self.state_store.get()
+        if state.devices is None:
             log.debug("No devices found")
             return None
 
-        if 'devices' in self.deviceList:
-            log.debug("Devices found: " + str(len(self.deviceList['devices'])))
-            return self.deviceList['devices']
-        else:
-            log.debug("No devices found")
-            return None
+        log.debug("Devices found: {}", len(state.devices))
+        return [device.to_dict() for device in state.devices]
+
+    def get_cached_devices(self) -> str:
+        """
+        Get all recently seen devices with their last seen time and if they
+        are listed right now, as JSON. Never waits for the Web API.
+        """
+        return json.dumps(self.device_cache.get_devices())
+
+    def refresh_devices(self) -> None:
+        """
+        Poll the device list in the background, e.g. when a config UI opens.
+        The frontend is notified by a pushed devices change.
+        """
+        self.last_active_api_call = time.time()
+        self.poll_scheduler.request_devices(wake=True)
 
     def get_active_device_id(self):
         """
         Get the active device ID
         """
-        if self.deviceList is None:
-            log.debug("No devices found")
-            return None
-
-        for device in self.deviceList['devices']:
-            if device['is_active']:
-                log.debug("Active Device id: " + str(device['id']))
-                return device['id']
-        return None
+        return self.state_store.get().get_active_device_id()
 
     def get_active_device_name(self):
         """
-        Get the active device ID
+        Get the active device name
         """
-        if self.deviceList is None:
-            log.debug("No devices found")
+        return self.state_store.get().device_index.get_active_device_name()
+
+    def is_authed(self) -> bool:
+        """
+        Check if the user is authenticated.
+        Answered from the in-memory auth state until the token expires
+        or the auth state gets invalidated.
+        """
+        if self.token_expires_at > time.time():
+            self.metrics.inc("cache_requests_total", cache="auth", result="hit")
+            return True
+        if self.auth_checked_at + AUTH_RECHECK_INTERVAL > time.time():
+            self.metrics.inc("cache_requests_total", cache="auth", result="hit")
+            return False
+        self.metrics.inc("cache_requests_total", cache="auth", result="miss")
+        return self.update_auth_state()
+
+    def update_auth_state(self) -> bool:
+        """
+        Validate the cached token and remember when it expires
+        """
+        token_info = None
+        if os.path.isfile(CACHE_PATH) and self.auth_manager:
+            # Refreshes the token if it is about to expire
+            token_info = self.auth_manager.validate_token(self.auth_manager.get_cached_token())
+        self.auth_checked_at = time.time()
+        if not token_info:
+            log.debug("Token is not valid")
+            self.token_expires_at = 0.0
+            return False
+
+        log.debug("Token is valid")
+        # spotipy refreshes tokens TOKEN_EXPIRY_MARGIN seconds before they expire
+        self.token_expires_at = token_info['expires_at'] - TOKEN_EXPIRY_MARGIN
+        self.token_refresher.schedule(token_info['expires_at'])
+        if flaskApp.get_server_status():
+            log.debug("Flask server is running")
+            flaskApp.stop_server()
+        return True
+
+    def refresh_token(self) -> float:
+        """
+        Refresh the cached token, called by the token refresher ahead of expiry.
+        Returns the expiry time of the new token, None if there is no token.
+        """
+        auth_manager = self.auth_manager
+        token_info = auth_manager.get_cached_token() if auth_manager else None
+        if not token_info or "refresh_token" not in token_info:
             return None
+        try:
+            with self.metrics.timed("token_refresh_seconds"):
+                token_info = auth_manager.refresh_access_token(token_info['refresh_token'])
+        except Exception:
+            self.metrics.inc("token_refresh_total", result="error")
+            raise
+        return self.token_refreshed(token_info)
 
-        for device in self.deviceList['devices']:
-            if device['is_active']:
-                log.debug("Active Device name: " + str(device['name']))
-                return device['name']
-        return None
+    def token_refreshed(self, token_info: dict) -> float:
+        """
+        Update the auth state after a refresh and return the new expiry time
+        """
+        self.metrics.inc("token_refresh_total", result="ok")
+        self.token_expires_at = token_info['expires_at'] - TOKEN_EXPIRY_MARGIN
+        return token_info['expires_at']
 
-    def is_authed(self) -> bool:
+    def invalidate_auth_state(self) -> None:
         """
-        Check if the user is authenticated
+        Force the next is_authed call to validate the token again
         """
-        if os.path.isfile(CACHE_PATH):
-            log.debug("Cache file found")
-            if self.auth_manager:
-                if self.auth_manager.validate_token(self.auth_manager.get_cached_token()):
-                    log.debug("Token is valid")
-                    if flaskApp.get_server_status():
-                        log.debug("Flask server is running")
-                        flaskApp.stop_server()
-                    return True
-        return False
+        self.token_expires_at = 0.0
+        self.auth_checked_at = 0.0
 
     def get_shuffle_mode(self) -> bool:
         """
         Get the current shuffle mode
         """
-        if not self.get_active_device_id():
+        state = self.state_store.get()
+        if not state.get_active_device_id():
             return None
 
-        curPlayback = self.current_playback_response
+        curPlayback = state.playback
         if curPlayback is None:
             log.debug("No current playback")
             return None
-        return curPlayback['shuffle_state']
+        return curPlayback.shuffle_state
 
     def shuffle(self, shuffle: bool, device_id=None) -> None:
         """
@@ -280,22 +807,24 @@ class SpotifyControlBackend(BackendBase):
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
-        self.spotifyObject.shuffle(shuffle, device_id=device_id)
+            raise CommandError("No active device found")
+        self.api_call(PRIORITY_COMMAND, "shuffle", shuffle, device_id=device_id)
+        self.poll_scheduler.notify_command()
 
     def get_playback_state(self) -> str:
         """
         Get the current playback state
         """
-        if not self.get_active_device_id():
+        state = self.state_store.get()
+        if not state.get_active_device_id():
             return None
 
-        curPlayback = self.current_playback_response
+        curPlayback = state.playback
         if curPlayback is None:
             log.debug("No current playback")
             return None
 
-        return curPlayback['is_playing']
+        return curPlayback.is_playing
 
     def pause(self, device_id) -> None:
         """
@@ -305,9 +834,10 @@ class SpotifyControlBackend(BackendBase):
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
-        log.debug("Pause on device: " + str(device_id))
-        self.spotifyObject.pause_playback(device_id=device_id)
+            raise CommandError("No active device found")
+        log.debug("Pause on device: {}", device_id)
+        self.api_call(PRIORITY_COMMAND, "pause_playback", device_id=device_id)
+        self.poll_scheduler.notify_command()
 
     def play(self, device_id) -> None:
         """
@@ -317,9 +847,10 @@ class SpotifyControlBackend(BackendBase):
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
-        log.debug("Play on device: " + str(device_id))
-        self.spotifyObject.start_playback(device_id=device_id)
+            raise CommandError("No active device found")
+        log.debug("Play on device: {}", device_id)
+        self.api_call(PRIORITY_COMMAND, "start_playback", device_id=device_id)
+        self.poll_scheduler.notify_command()
 
     def next_track(self, device_id) -> None:
         """
@@ -329,9 +860,10 @@ class SpotifyControlBackend(BackendBase):
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
-        log.debug("Next track on device: " + str(device_id))
-        self.spotifyObject.next_track(device_id=device_id)
+            raise CommandError("No active device found")
+        log.debug("Next track on device: {}", device_id)
+        self.api_call(PRIORITY_COMMAND, "next_track", device_id=device_id)
+        self.poll_scheduler.notify_command()
 
     def previous_track(self, device_id) -> None:
         """
@@ -341,9 +873,10 @@ class SpotifyControlBackend(BackendBase):
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
-        log.debug("Previous track on device: " + str(device_id))
-        self.spotifyObject.previous_track(device_id=device_id)
+            raise CommandError("No active device found")
+        log.debug("Previous track on device: {}", device_id)
+        self.api_call(PRIORITY_COMMAND, "previous_track", device_id=device_id)
+        self.poll_scheduler.notify_command()
 
     def set_volume(self, volume: int, device_id) -> None:
         """
@@ -351,54 +884,93 @@ class SpotifyControlBackend(BackendBase):
         """
         if device_id is None:
             device_id = self.get_active_device_id()
-        log.debug("Set volume on device: " + str(device_id) + " to " + str(volume))
-        self.spotifyObject.volume(int(volume), device_id=device_id)
+        log.debug("Set volume on device: {} to {}", device_id, volume)
+        self.api_call(PRIORITY_COMMAND, "volume", int(volume), device_id=device_id)
+        self.poll_scheduler.notify_command()
+
+    def adjust_volume(self, delta: int, device_id=None, callback=None) -> int:
+        """
+        Change the volume by delta. The new volume is applied locally at once,
+        rapid changes are collected and only the final volume is sent.
+        """
+        if device_id is None:
+            device_id = self.get_active_device_id()
+        if device_id is None:   # No active Device found
+            return None
+
+        old_volume = self.get_volume(device_id)
+        if old_volume is None:
+            return None
+        volume = self.volume_accumulator.adjust(device_id, old_volume, delta, callback)
+        log.debug("Adjust volume on device: {} to {}", device_id, volume)
+        self.refresh_snapshot(self.is_authed())
+        return volume
+
+    def send_accumulated_volume(self, volume: int, device_id, callback=None) -> None:
+        """
+        Queue the final volume collected by the volume accumulator
+        """
+        args = (volume, device_id)
+        self.command_queue.put("set_volume", self.set_volume, args,
+                               self.command_done_callback("set_volume", args, callback))
 
     def get_volume(self, device_id) -> int:
         """
-        Get the current volume
+        Get the current volume of the device or of the active device if device_id is None
         """
-        curPlayback = self.current_playback_response
-        if curPlayback is None:
-            log.debug("No current playback")
+        state = self.state_store.get()
+        if device_id is None:
+            device_id = state.get_active_device_id()
+        if device_id is None:   # No active Device found
             return None
-        if curPlayback['device']['supports_volume']:
-            return curPlayback['device']['volume_percent']
-        else:
-            log.debug("Device " + str(curPlayback['name']) +
-                    " does not support volume control")
+        return self.read_volume(state, device_id)
+
+    def read_volume(self, state, device_id: str) -> int:
+        """
+        Get the volume of the device in the given state, the local volume
+        of a pending volume change takes precedence
+        """
+        local_volume = self.volume_accumulator.get(device_id)
+        if local_volume is not None:
+            return local_volume
+
+        if not state.device_index.supports_volume(device_id):
+            log.debug("Device {} does not support volume control", device_id)
             return None
+        return state.device_index.get_volume(device_id)
 
     def repeat(self, repeat: str, device_id) -> None:
         """
         Set the repeat mode
         """
-        if repeat not in ['off', 'track', 'context']:
-            log.error("Invalid repeat mode: " + str(repeat))
-            return
+        if repeat not in REPEAT_MODES:
+            raise CommandError("Invalid repeat mode: {}".format(repeat))
 
         if device_id is None:
             device_id = self.get_active_device_id()
 
         if device_id is None:   # No active Device found
-            return
+            raise CommandError("No active device found")
 
-        log.debug("Set repeat on device: " + str(device_id) + " to " + str(repeat))
-        self.spotifyObject.repeat(repeat, device_id)
+        log.debug("Set repeat on device: {} to {}", device_id, repeat)
+        self.api_call(PRIORITY_COMMAND, "repeat", repeat, device_id)
+        self.poll_scheduler.notify_command()
 
     def get_current_repeat_state(self) -> str:
         """
         Get the current shuffle mode
         """
-        if not self.get_active_device_id():
+        state = self.state_store.get()
+        if not state.get_active_device_id():
             return None
 
-        curPlayback = self.current_playback_response
+        curPlayback = state.playback
         if curPlayback is None:
             log.debug("No current playback")
             return None
 
-        return curPlayback['repeat_state'] # context - Repeat playlist, track - Repeat track, off - Repeat off
+        return curPlayback.repeat_state # context - Repeat playlist, track - Repeat track, off - Repeat off
 
-backend = SpotifyControlBackend()
-log.debug("SpotifyControlBackend initialized")
+if __name__ == "__main__":
+    backend = SpotifyControlBackend()
+    log.debug("SpotifyControlBackend initialized")
@@ -0,0 +1,47 @@
+import queue, threading
+from log_utils import log
+
+# Valid modes of the repeat command
+REPEAT_MODES = ("off", "track", "context")
+
+class CommandError(Exception):
+    """
+    Raised if a player command can not be sent, e.g. without an active device
+    """
+
+class CommandQueue:
+    """
+    Runs player commands on a worker thread so the RPC caller does not
+    wait for the Web API round trip.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name="command_queue")
+        self.worker.daemon = True
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def put(self, name: str, func, args: tuple, callback=None) -> None:
+        """
+        Queue a command. The callback is called with the success of the command
+        """
+        self.queue.put((name, func, args, callback))
+
+    def run(self) -> None:
+        while True:
+            name, func, args, callback = self.queue.get()
+            log.debug("Run command {}{}", name, args)
+            try:
+                func(*args)
+                success = True
+            except Exception as e:
+                log.error("Command {} failed: {}", name, e)
+                success = False
+
+            if callback is not None:
+                try:
+                    callback(success)
+                except Exception as e:
+                    log.error("Command callback of {} failed: {}", name, e)
@@ -0,0 +1,47 @@
+import threading, time
+
+# Seconds a device is kept after it was last listed by the Web API
+DEVICE_RETENTION = 3600.0
+
+class DeviceCache:
+    """
+    Devices seen in the devices polls with the time they were last listed.
+    Keeps recently seen devices that are currently offline, e.g. for the
+    device selector of the actions.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.devices = {}
+        self.updated_at = 0.0
+
+    def update(self, devices: list) -> None:
+        """
+        Store the devices of a devices poll and drop devices not seen for too long
+        """
+        if devices is None:
+            return
+        now = time.time()
+        with self.lock:
+            for device in devices:
+                self.devices[device.id] = {
+                    "id": device.id,
+                    "name": device.name,
+                    "type": device.type,
+                    "is_active": device.is_active,
+                    "last_seen": now,
+                }
+            for device_id, device in list(self.devices.items()):
+                if now - device["last_seen"] > DEVICE_RETENTION:
+                    del self.devices[device_id]
+            self.updated_at = now
+
+    def get_devices(self) -> list:
+        """
+        Get the cached devices, listed devices first and then by last seen
+        """
+        with self.lock:
+            devices = [dict(device, available=device["last_seen"] >= self.updated_at)
+                       for device in self.devices.values()]
+        devices.sort(key=lambda device: (not device["available"], -device["last_seen"]))
+        return devices
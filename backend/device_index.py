@@ -0,0 +1,53 @@
+class DeviceIndex:
+    """
+    Active device and volume state of a device list, built once per
+    devices poll so the lookups do not scan the list.
+    """
+
+    def __init__(self, devices: list = None):
+        self.devices = []
+        self.active_device = None
+        self.volumes = {}
+        self.volume_support = {}
+
+        if devices is None:
+            return
+        self.devices = list(devices)
+        for device in self.devices:
+            if self.active_device is None and device.is_active:
+                self.active_device = device
+            self.update_volume(device.id, device.volume_percent, device.supports_volume)
+
+    def copy(self) -> "DeviceIndex":
+        """
+        Get a copy whose volumes can be updated without changing this index
+        """
+        index = DeviceIndex()
+        index.devices = self.devices
+        index.active_device = self.active_device
+        index.volumes = dict(self.volumes)
+        index.volume_support = dict(self.volume_support)
+        return index
+
+    def get_active_device_id(self) -> str:
+        if self.active_device is None:
+            return None
+        return self.active_device.id
+
+    def get_active_device_name(self) -> str:
+        if self.active_device is None:
+            return None
+        return self.active_device.name
+
+    def update_volume(self, device_id: str, volume: int, supports_volume: bool) -> None:
+        """
+        Store the volume of a device, e.g. from the device of a playback poll
+        """
+        self.volumes[device_id] = volume
+        self.volume_support[device_id] = supports_volume
+
+    def get_volume(self, device_id: str) -> int:
+        return self.volumes.get(device_id)
+
+    def supports_volume(self, device_id: str) -> bool:
+        return self.volume_support.get(device_id, False)
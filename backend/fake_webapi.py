@@ -0,0 +1,299 @@
+"""
+Offline stand-in for the parts of the Spotify Web API the backend uses.
+
+Run it and point the backend at it to exercise the plugin without a
+Spotify account, e.g. for benchmarks or CI:
+
+    python fake_webapi.py --port 8900 --devices 3 --latency 0.05
+    SPOTIFY_CONTROL_API_URL=http://127.0.0.1:8900/v1/ \
+    SPOTIFY_CONTROL_TOKEN_URL=http://127.0.0.1:8900/api/token ...
+
+The fake can be reconfigured at runtime with a JSON POST to /fake/config
+(latency, rate_limit_every, retry_after, unauthorized) and reports the
+requests it served per endpoint on /fake/stats.
+"""
+import argparse, threading, time, uuid
+
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from log_utils import log
+
+TRACK_DURATION_MS = 180000
+
+class FakeWebApi(threading.Thread):
+    """
+    Fake Web API server running on its own thread
+    """
+
+    def __init__(self, port: int = 0, devices: int = 2, latency: float = 0.0):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.lock = threading.Lock()
+
+        # Fault injection
+        self.latency = latency
+        self.rate_limit_every = 0
+        self.retry_after = 1
+        self.unauthorized = 0
+
+        self.requests = 0
+        self.stats = {}
+
+        self.devices = [{
+            "id": uuid.uuid4().hex,
+            "name": "Fake Device " + str(index + 1),
+            "type": "Computer" if index == 0 else "Speaker",
+            "is_active": index == 0,
+            "is_private_session": False,
+            "is_restricted": False,
+            "supports_volume": True,
+            "volume_percent": 50,
+        } for index in range(max(1, devices))]
+        self.is_playing = False
+        self.shuffle_state = False
+        self.repeat_state = "off"
+        self.track = 0
+        self.progress_ms = 0
+        self.progress_at = time.time()
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/api/token", view_func=self.token, methods=["POST"])
+        self.app.add_url_rule("/v1/me/player", view_func=self.player, methods=["GET", "PUT"])
+        self.app.add_url_rule("/v1/me/player/devices", view_func=self.get_devices)
+        self.app.add_url_rule("/v1/me/player/play", view_func=self.play, methods=["PUT"])
+        self.app.add_url_rule("/v1/me/player/pause", view_func=self.pause, methods=["PUT"])
+        self.app.add_url_rule("/v1/me/player/next", view_func=self.next, methods=["POST"])
+        self.app.add_url_rule("/v1/me/player/previous", view_func=self.previous, methods=["POST"])
+        self.app.add_url_rule("/v1/me/player/volume", view_func=self.volume, methods=["PUT"])
+        self.app.add_url_rule("/v1/me/player/shuffle", view_func=self.shuffle, methods=["PUT"])
+        self.app.add_url_rule("/v1/me/player/repeat", view_func=self.repeat, methods=["PUT"])
+        self.app.add_url_rule("/fake/config", view_func=self.config, methods=["POST"])
+        self.app.add_url_rule("/fake/stats", view_func=self.get_stats)
+        self.app.before_request(self.before_request)
+
+        self.server = make_server("127.0.0.1", port, self.app, threaded=True)
+        self.port = self.server.port
+
+    @property
+    def api_url(self) -> str:
+        return "http://127.0.0.1:" + str(self.port) + "/v1/"
+
+    @property
+    def token_url(self) -> str:
+        return "http://127.0.0.1:" + str(self.port) + "/api/token"
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+
+    ### Request handling ###
+    def before_request(self):
+        if request.path.startswith("/fake/"):
+            return None
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests += 1
+            endpoint = request.method + " " + request.path
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                response = jsonify(error={"status": 429, "message": "API rate limit exceeded"})
+                response.status_code = 429
+                response.headers["Retry-After"] = str(self.retry_after)
+                return response
+
+            if request.path.startswith("/v1/"):
+                if self.unauthorized > 0 or not request.headers.get("Authorization", "").startswith("Bearer "):
+                    self.unauthorized = max(0, self.unauthorized - 1)
+                    response = jsonify(error={"status": 401, "message": "The access token expired"})
+                    response.status_code = 401
+                    return response
+        return None
+
+    def token(self):
+        return jsonify(access_token="fake-" + uuid.uuid4().hex,
+                       token_type="Bearer",
+                       expires_in=3600,
+                       refresh_token="fake-refresh-token",
+                       scope=request.form.get("scope", ""))
+
+    def config(self):
+        values = request.get_json(force=True) or {}
+        with self.lock:
+            for key in ("latency", "rate_limit_every", "retry_after", "unauthorized"):
+                if key in values:
+                    setattr(self, key, values[key])
+        return jsonify(ok=True)
+
+    def get_stats(self):
+        with self.lock:
+            return jsonify(requests=self.requests, endpoints=dict(self.stats))
+
+    def conditional(self, response):
+        """
+        Add an ETag and answer 304 Not Modified if it matches If-None-Match,
+        like the Web API does for the device list
+        """
+        response.add_etag()
+        return response.make_conditional(request)
+
+    ### Player state ###
+    def active_device(self) -> dict:
+        for device in self.devices:
+            if device["is_active"]:
+                return device
+        return None
+
+    def select_device(self):
+        """
+        Get the device of the device_id argument or the active device.
+        Activates the requested device like Spotify does.
+        """
+        device_id = request.args.get("device_id")
+        if device_id is None:
+            return self.active_device()
+        for device in self.devices:
+            device["is_active"] = device["id"] == device_id
+        return self.active_device()
+
+    def update_progress(self) -> None:
+        now = time.time()
+        if self.is_playing:
+            self.progress_ms += int((now - self.progress_at) * 1000)
+            while self.progress_ms >= TRACK_DURATION_MS:
+                self.progress_ms -= TRACK_DURATION_MS
+                self.track += 1
+        self.progress_at = now
+
+    def playback(self) -> dict:
+        self.update_progress()
+        device = self.active_device()
+        item = {
+            "id": "track" + str(self.track),
+            "name": "Fake Track " + str(self.track),
+            "type": "track",
+            "duration_ms": TRACK_DURATION_MS,
+            "artists": [{"id": "artist", "name": "Fake Artist", "type": "artist"}],
+            "album": {
+                "id": "album",
+                "name": "Fake Album",
+                "images": [{"url": "http://127.0.0.1/image" + str(size), "height": size, "width": size}
+                           for size in (640, 300, 64)],
+            },
+        }
+        return {
+            "device": dict(device),
+            "shuffle_state": self.shuffle_state,
+            "repeat_state": self.repeat_state,
+            "timestamp": int(time.time() * 1000),
+            "context": None,
+            "progress_ms": self.progress_ms,
+            "item": item,
+            "currently_playing_type": "track",
+            "actions": {"disallows": {}},
+            "is_playing": self.is_playing,
+        }
+
+    def no_device(self):
+        response = jsonify(error={"status": 404, "message": "Player command failed: No active device found"})
+        response.status_code = 404
+        return response
+
+    def player(self):
+        with self.lock:
+            if request.method == "PUT":
+                # Transfer playback
+                device_ids = (request.get_json(force=True) or {}).get("device_ids", [])
+                for device in self.devices:
+                    device["is_active"] = device["id"] in device_ids
+                return "", 204
+            if self.active_device() is None:
+                return "", 204
+            return jsonify(self.playback())
+
+    def get_devices(self):
+        with self.lock:
+            return self.conditional(jsonify(devices=[dict(device) for device in self.devices]))
+
+    def play(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            self.update_progress()
+            self.is_playing = True
+            return "", 204
+
+    def pause(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            self.update_progress()
+            self.is_playing = False
+            return "", 204
+
+    def next(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            self.track += 1
+            self.progress_ms = 0
+            self.progress_at = time.time()
+            return "", 204
+
+    def previous(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            self.track = max(0, self.track - 1)
+            self.progress_ms = 0
+            self.progress_at = time.time()
+            return "", 204
+
+    def volume(self):
+        with self.lock:
+            device = self.select_device()
+            if device is None:
+                return self.no_device()
+            device["volume_percent"] = max(0, min(100, int(request.args.get("volume_percent", 0))))
+            return "", 204
+
+    def shuffle(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            self.shuffle_state = request.args.get("state") == "true"
+            return "", 204
+
+    def repeat(self):
+        with self.lock:
+            if self.select_device() is None:
+                return self.no_device()
+            state = request.args.get("state")
+            if state not in ("off", "track", "context"):
+                response = jsonify(error={"status": 400, "message": "Invalid repeat state"})
+                response.status_code = 400
+                return response
+            self.repeat_state = state
+            return "", 204
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Spotify Web API")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds every request is delayed")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every n-th request with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeWebApi(args.port, args.devices, args.latency)
+    fake.rate_limit_every = args.rate_limit_every
+    fake.retry_after = args.retry_after
+    log.info("Fake Web API running on {}", fake.api_url)
+    fake.run()
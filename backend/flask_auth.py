@@ -3,7 +3,7 @@ import os
 from flask import Flask, request
 import threading
 from werkzeug.serving import make_server
-from loguru import logger as log
+from log_utils import log
 
 server = None
 
@@ -53,7 +53,7 @@ class FlaskAuth(threading.Thread):
 def start_server(backend, port):
     global server
     # App routes defined here
-    log.debug("Setup Server on port: " + str(port))
+    log.debug("Setup Server on port: {}", port)
     server = FlaskAuth(backend, port)
     server.token = None
     log.debug("Starting Server...")
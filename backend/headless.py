@@ -0,0 +1,58 @@
+"""
+Runs the backend without StreamController against the fake Web API from
+fake_webapi.py. Shared by the benchmarks and the tests.
+"""
+import importlib.util, json, os, time
+from fake_webapi import FakeWebApi
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCOPE = "user-read-playback-state user-modify-playback-state user-read-currently-playing app-remote-control"
+
+def load_backend_module(fake: FakeWebApi, cache_path: str):
+    """
+    Import backend.py configured to use the fake Web API with a valid cached token
+    """
+    os.environ["SPOTIFY_CONTROL_API_URL"] = fake.api_url
+    os.environ["SPOTIFY_CONTROL_TOKEN_URL"] = fake.token_url
+    os.environ["SPOTIFY_CONTROL_CACHE_PATH"] = cache_path
+    with open(cache_path, "w") as cache:
+        json.dump({
+            "access_token": "fake-token",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "refresh_token": "fake-refresh-token",
+            "scope": SCOPE,
+            "expires_at": int(time.time()) + 3600,
+        }, cache)
+
+    spec = importlib.util.spec_from_file_location("spotify_control_backend",
+                                                  os.path.join(BACKEND_DIR, "backend.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def create_backend(module, frontend=None, run_poller: bool = False):
+    """
+    Create an authenticated backend of the loaded module that pushes its
+    state changes to the given frontend instead of connecting to StreamController.
+    Without the poller, the caller polls explicitly.
+    """
+    class HeadlessBackend(module.SpotifyControlBackend):
+        def connect_to_frontend(self):
+            self.frontend = frontend
+
+        def start_server(self):
+            pass
+
+        def register_to_frontend(self):
+            pass
+
+        def ticked_api_call(self):
+            if run_poller:
+                super().ticked_api_call()
+
+    backend = HeadlessBackend()
+    if not backend.reauthenticate("headless-client", 8080):
+        raise RuntimeError("Could not authenticate against the fake Web API")
+    return backend
@@ -0,0 +1,123 @@
+import threading
+from urllib.parse import urlsplit
+import requests
+
+# Seconds to wait for a connection to the Web API
+CONNECT_TIMEOUT = 3.05
+# Seconds to wait for a response of the Web API
+READ_TIMEOUT = 10
+REQUESTS_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Connections kept alive per host
+POOL_MAXSIZE = 4
+
+DEVICES_PATH = "me/player/devices"
+# Web API paths requested with the ETag of the last response. The playback
+# changes with its progress and is practically never answered with 304.
+CONDITIONAL_PATHS = (DEVICES_PATH,)
+
+class ETagCache:
+    """
+    ETag and parsed body of the last response of the conditional paths.
+    A 304 Not Modified response has no body, its caller reuses the object
+    parsed from the last full response instead.
+    """
+
+    def __init__(self, record=None):
+        # record("hit") or record("miss") is called for every conditional request
+        self.record = record
+        self.lock = threading.Lock()
+        # Path: [ETag, parsed body, last response was 304]
+        self.entries = {}
+
+    def get_path(self, url: str) -> str:
+        """
+        Get the conditional path of a request URL, None if it is not conditional
+        """
+        path = urlsplit(url).path
+        for conditional_path in CONDITIONAL_PATHS:
+            if path == conditional_path or path.endswith("/" + conditional_path):
+                return conditional_path
+        return None
+
+    def get_etag(self, path: str) -> str:
+        """
+        Get the ETag to send for the path, None until a response was parsed
+        """
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[1] is None:
+                return None
+            return entry[0]
+
+    def response(self, path: str, status: int, etag: str) -> None:
+        """
+        Record the status and ETag of a response of the path
+        """
+        with self.lock:
+            entry = self.entries.get(path)
+            if status == 304 and entry is not None:
+                entry[2] = True
+                hit = True
+            elif status == 200 and etag:
+                self.entries[path] = [etag, None, False]
+                hit = None if entry is None else False
+            else:
+                return
+        if hit is not None and self.record is not None:
+            self.record("hit" if hit else "miss")
+
+    def parse(self, path: str, body, parse):
+        """
+        Get parse(body) and keep it for the next 304 of the path,
+        or the kept object if the last response was 304
+        """
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[2]:
+                entry[2] = False
+                return entry[1]
+        parsed = parse(body)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[1] is None:
+                entry[1] = parsed
+        return parsed
+
+class ConditionalAdapter(requests.adapters.HTTPAdapter):
+    """
+    Sends GET requests of the conditional paths with the ETag of the last
+    response. An unchanged state is answered with an empty 304 Not Modified
+    response, which the spotify client returns as None.
+    """
+
+    def __init__(self, etag_cache: ETagCache, **kwargs):
+        self.etag_cache = etag_cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        path = self.etag_cache.get_path(request.url) if request.method == "GET" else None
+        if path is None:
+            return super().send(request, **kwargs)
+
+        etag = self.etag_cache.get_etag(path)
+        if etag is not None:
+            request.headers["If-None-Match"] = etag
+        response = super().send(request, **kwargs)
+        self.etag_cache.response(path, response.status_code, response.headers.get("ETag"))
+        return response
+
+def create_session(etag_cache: ETagCache = None) -> requests.Session:
+    """
+    Create the HTTP session shared by all Web API and token requests.
+    Connections are pooled and kept alive so requests skip the TLS
+    handshake. Retries are left to the request governor. GET requests
+    of the conditional paths use the ETag cache if one is given.
+    """
+    session = requests.Session()
+    adapter = ConditionalAdapter(etag_cache or ETagCache(), pool_connections=2, pool_maxsize=POOL_MAXSIZE,
+                                 max_retries=0, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
@@ -0,0 +1,82 @@
+import os, threading, time
+from loguru import logger
+
+# Level of the plugin logs, can be changed at runtime with set_level
+LOG_LEVEL = os.environ.get("SPOTIFY_CONTROL_LOG_LEVEL", "INFO")
+# Seconds between two messages of the same sampled key
+SAMPLE_INTERVAL = 30.0
+
+LEVEL_NUMBERS = {"TRACE": 5, "DEBUG": 10, "INFO": 20, "SUCCESS": 25,
+                 "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+class PluginLogger:
+    """
+    Level gated front of loguru shared by the backend and the actions.
+    Messages take loguru {} placeholders and are only formatted if their
+    level is enabled, so disabled messages cost a single comparison.
+    """
+
+    def __init__(self, level: str = LOG_LEVEL):
+        self.level_no = LEVEL_NUMBERS["INFO"]
+        self.set_level(level)
+        self.sample_lock = threading.Lock()
+        self.sampled_at = {}
+        self.suppressed = {}
+
+    def set_level(self, level: str) -> bool:
+        """
+        Set the lowest level that is logged
+        """
+        level = str(level).upper()
+        if level not in LEVEL_NUMBERS:
+            logger.error("Unknown log level: {}", level)
+            return False
+        self.level_no = LEVEL_NUMBERS[level]
+        return True
+
+    def get_level(self) -> str:
+        for name, level_no in LEVEL_NUMBERS.items():
+            if level_no == self.level_no:
+                return name
+        return str(self.level_no)
+
+    def trace(self, message: str, *args, **kwargs) -> None:
+        if self.level_no <= LEVEL_NUMBERS["TRACE"]:
+            logger.opt(depth=1).trace(message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs) -> None:
+        if self.level_no <= LEVEL_NUMBERS["DEBUG"]:
+            logger.opt(depth=1).debug(message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs) -> None:
+        if self.level_no <= LEVEL_NUMBERS["INFO"]:
+            logger.opt(depth=1).info(message, *args, **kwargs)
+
+    def warning(self, message: str, *args, **kwargs) -> None:
+        if self.level_no <= LEVEL_NUMBERS["WARNING"]:
+            logger.opt(depth=1).warning(message, *args, **kwargs)
+
+    def error(self, message: str, *args, **kwargs) -> None:
+        if self.level_no <= LEVEL_NUMBERS["ERROR"]:
+            logger.opt(depth=1).error(message, *args, **kwargs)
+
+    def sampled(self, key: str, message: str, *args, level: str = "DEBUG") -> None:
+        """
+        Log a message of a per tick code path at most once per SAMPLE_INTERVAL.
+        The number of skipped messages is appended.
+        """
+        if LEVEL_NUMBERS[level] < self.level_no:
+            return
+        now = time.monotonic()
+        with self.sample_lock:
+            if now - self.sampled_at.get(key, -SAMPLE_INTERVAL) < SAMPLE_INTERVAL:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return
+            self.sampled_at[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            message += " ({} similar messages skipped)"
+            args += (suppressed,)
+        logger.opt(depth=1).log(level, message, *args)
+
+log = PluginLogger()
@@ -0,0 +1,131 @@
+import threading, time
+from contextlib import contextmanager
+
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+from log_utils import log
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets
+    """
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": dict(zip((str(bound) for bound in LATENCY_BUCKETS), self.bucket_counts)),
+        }
+
+class Metrics:
+    """
+    Counters and latency histograms of the backend hot paths
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, amount: int = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timed(self, name: str, **labels):
+        """
+        Observe the duration of the with block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_dict(self, gauges: dict = None) -> dict:
+        with self.lock:
+            return {
+                "uptime": round(time.time() - self.started_at, 3),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in self.counters.items()],
+                "histograms": [dict(name=name, labels=dict(labels), **histogram.to_dict())
+                               for (name, labels), histogram in self.histograms.items()],
+                "gauges": gauges or {},
+            }
+
+    def to_prometheus(self, gauges: dict = None) -> str:
+        """
+        Render the metrics in the Prometheus text format
+        """
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(name + format_labels(labels) + " " + str(value))
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                    lines.append(name + "_bucket" + format_labels(labels + (("le", str(bound)),)) + " " + str(count))
+                lines.append(name + "_bucket" + format_labels(labels + (("le", "+Inf"),)) + " " + str(histogram.count))
+                lines.append(name + "_sum" + format_labels(labels) + " " + str(histogram.sum))
+                lines.append(name + "_count" + format_labels(labels) + " " + str(histogram.count))
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(name + " " + str(value))
+        return "\n".join(lines) + "\n"
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(key + "=\"" + str(value) + "\"" for key, value in labels) + "}"
+
+class MetricsServer(threading.Thread):
+    """
+    Serves the metrics of the backend in the Prometheus text format on /metrics
+    """
+
+    def __init__(self, render, port: int):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.render = render
+        self.server = make_server("127.0.0.1", port, self.app, handler_class=QuietRequestHandler)
+        log.debug("Metrics endpoint on port: {}", port)
+
+    def app(self, environ, start_response):
+        if environ.get("PATH_INFO") != "/metrics":
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"Not Found\n"]
+        body = self.render().encode()
+        start_response("200 OK", [("Content-Type", "text/plain; version=0.0.4"),
+                                  ("Content-Length", str(len(body)))])
+        return [body]
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
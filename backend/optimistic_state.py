@@ -0,0 +1,51 @@
+import threading, time
+from playback_model import PlaybackState
+
+# Seconds a patched value waits for a poll to confirm it before it is rolled back
+CONFIRM_TIMEOUT = 3.0
+
+class OptimisticState:
+    """
+    Playback values patched locally after a command that are waiting
+    for a poll to confirm them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def patch(self, playback: PlaybackState, key: str, value) -> PlaybackState:
+        """
+        Mark the value as pending and return a patched copy of the playback
+        """
+        with self.lock:
+            self.pending[key] = (value, time.monotonic() + CONFIRM_TIMEOUT)
+        if playback is None:
+            return None
+        return playback.replace(**{key: value})
+
+    def drop(self, key: str) -> None:
+        """
+        Roll back a pending value, e.g. if the command failed
+        """
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def reconcile(self, playback: PlaybackState) -> PlaybackState:
+        """
+        Confirm the pending values matching the polled playback, roll back
+        the timed out ones and return the playback with the rest applied
+        """
+        if playback is None:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            patched = {}
+            for key, (value, deadline) in list(self.pending.items()):
+                if getattr(playback, key) == value or now > deadline:
+                    del self.pending[key]
+                else:
+                    patched[key] = value
+        if not patched:
+            return playback
+        return playback.replace(**patched)
@@ -0,0 +1,108 @@
+"""
+Compact records of the Web API responses the backend keeps between polls.
+They are built once per poll with only the fields the actions and the poll
+scheduler use, the track, album, artist and image objects are dropped.
+"""
+
+# Keys of the backend snapshot that are diffed between two versions and
+# pushed to the plugin. Shared by the backend and the plugin snapshot.
+SNAPSHOT_KEYS = ("authed", "active_device", "devices", "is_playing",
+                 "shuffle_state", "repeat_state", "volume_percent", "device_volumes")
+
+class Device:
+    """
+    Immutable device of a devices or playback response
+    """
+    __slots__ = ("id", "name", "type", "is_active", "volume_percent", "supports_volume")
+
+    def __init__(self, id: str, name: str, type: str = None, is_active: bool = False,
+                 volume_percent: int = None, supports_volume: bool = True):
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "type", type)
+        object.__setattr__(self, "is_active", is_active)
+        object.__setattr__(self, "volume_percent", volume_percent)
+        object.__setattr__(self, "supports_volume", supports_volume)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Device is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, Device):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return "Device({!r}, {!r})".format(self.id, self.name)
+
+    @classmethod
+    def from_response(cls, device: dict) -> "Device":
+        return cls(device['id'], device['name'], device.get('type'), device.get('is_active', False),
+                   device.get('volume_percent'), device.get('supports_volume', True))
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+class PlaybackState:
+    """
+    Immutable playback state of a current_playback response
+    """
+    __slots__ = ("is_playing", "shuffle_state", "repeat_state", "progress_ms", "duration_ms", "device")
+
+    def __init__(self, is_playing: bool = False, shuffle_state: bool = False, repeat_state: str = "off",
+                 progress_ms: int = None, duration_ms: int = None, device: Device = None):
+        object.__setattr__(self, "is_playing", is_playing)
+        object.__setattr__(self, "shuffle_state", shuffle_state)
+        object.__setattr__(self, "repeat_state", repeat_state)
+        object.__setattr__(self, "progress_ms", progress_ms)
+        # None if nothing or an episode is playing
+        object.__setattr__(self, "duration_ms", duration_ms)
+        object.__setattr__(self, "device", device)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PlaybackState is immutable")
+
+    def __repr__(self):
+        return "PlaybackState({})".format(", ".join(
+            "{}={!r}".format(field, getattr(self, field)) for field in self.__slots__))
+
+    @classmethod
+    def from_response(cls, playback: dict) -> "PlaybackState":
+        device = playback.get('device')
+        item = playback.get('item')
+        return cls(playback.get('is_playing', False), playback.get('shuffle_state', False),
+                   playback.get('repeat_state', "off"), playback.get('progress_ms'),
+                   item.get('duration_ms') if item is not None else None,
+                   Device.from_response(device) if device is not None else None)
+
+    def replace(self, **changes) -> "PlaybackState":
+        """
+        Get a copy with the given fields changed, e.g. an optimistic patch
+        """
+        fields = {field: getattr(self, field) for field in self.__slots__}
+        fields.update(changes)
+        return PlaybackState(**fields)
+
+    def diff(self, other: "PlaybackState") -> tuple:
+        """
+        Get the fields that differ from the other playback state
+        """
+        if other is None:
+            return self.__slots__
+        return tuple(field for field in self.__slots__ if getattr(self, field) != getattr(other, field))
+
+def parse_playback(playback: dict) -> PlaybackState:
+    """
+    Build the playback state of a current_playback response, None stays None
+    """
+    if playback is None:
+        return None
+    return PlaybackState.from_response(playback)
+
+def parse_devices(devices: dict) -> list:
+    """
+    Build the devices of a devices response, None stays None
+    """
+    if devices is None:
+        return None
+    return [Device.from_response(device) for device in devices.get('devices') or []]
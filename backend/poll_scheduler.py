@@ -0,0 +1,85 @@
+import threading, time
+
+# Poll interval while playing
+BASE_INTERVAL = 1.0
+# Poll interval right after a command was sent
+FAST_INTERVAL = 0.25
+# Seconds the fast interval is used after a command
+BOOST_DURATION = 3.0
+# Upper bound for the exponential back off while paused
+MAX_PAUSED_INTERVAL = 8.0
+# Seconds after the end of a track before the next track is polled
+TRACK_END_DELAY = 0.2
+# Poll interval of the device list
+DEVICES_INTERVAL = 15.0
+
+class PollScheduler:
+    """
+    Decides when the playback state and the device list are polled next.
+    Polls fast after a command or at the end of a track and backs off
+    exponentially while nothing is playing.
+    """
+
+    def __init__(self):
+        self.wake_event = threading.Event()
+        self.last_command = 0.0
+        self.paused_interval = BASE_INTERVAL
+        self.next_devices_poll = 0.0
+
+    def notify_command(self) -> None:
+        """
+        Called after a command was sent. Polls fast for a short time
+        """
+        self.last_command = time.monotonic()
+        self.paused_interval = BASE_INTERVAL
+        self.wake_event.set()
+
+    def request_devices(self, wake: bool = False) -> None:
+        """
+        Poll the device list with the next playback poll,
+        right away if wake is set
+        """
+        self.next_devices_poll = 0.0
+        if wake:
+            self.wake_event.set()
+
+    def devices_due(self) -> bool:
+        """
+        Check if the device list has to be polled
+        """
+        return time.monotonic() >= self.next_devices_poll
+
+    def devices_polled(self) -> None:
+        """
+        Called after the device list was polled
+        """
+        self.next_devices_poll = time.monotonic() + DEVICES_INTERVAL
+
+    def next_interval(self, playback) -> float:
+        """
+        Get the seconds until the next playback poll
+        """
+        if time.monotonic() - self.last_command < BOOST_DURATION:
+            return FAST_INTERVAL
+
+        if playback is None or not playback.is_playing:
+            interval = self.paused_interval
+            self.paused_interval = min(self.paused_interval * 2, MAX_PAUSED_INTERVAL)
+            return interval
+        self.paused_interval = BASE_INTERVAL
+
+        if playback.duration_ms is None or playback.progress_ms is None:
+            return BASE_INTERVAL
+
+        # Poll right after the track ended to show the next track in time
+        remaining = (playback.duration_ms - playback.progress_ms) / 1000
+        if remaining + TRACK_END_DELAY < BASE_INTERVAL:
+            return max(FAST_INTERVAL, remaining + TRACK_END_DELAY)
+        return BASE_INTERVAL
+
+    def wait(self, interval: float) -> None:
+        """
+        Sleep until the next poll. A command wakes the poller up early
+        """
+        self.wake_event.wait(interval)
+        self.wake_event.clear()
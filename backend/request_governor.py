@@ -0,0 +1,157 @@
+import asyncio, threading, time
+import spotipy
+from log_utils import log
+
+# Request priorities, lower values are served first
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+
+# Requests per second the token bucket refills
+BUCKET_RATE = 2.0
+# Maximum burst of requests
+BUCKET_SIZE = 10
+# Tokens only commands may use, polls wait while the bucket is below it
+COMMAND_RESERVE = 3
+# Seconds a command waits for the rate limit before it fails
+COMMAND_MAX_WAIT = 5.0
+
+class RateLimitedError(Exception):
+    """
+    Raised if a request can not be sent within its maximum wait time
+    """
+
+class RequestGovernor:
+    """
+    Central gate for all Web API requests of the backend.
+    Limits the request rate with a token bucket, keeps a shared back off
+    after a 429 response honoring Retry-After and serves user commands
+    before background polls.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.tokens = float(BUCKET_SIZE)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting_commands = 0
+
+        self.requests = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    def call(self, priority: int, func, *args, **kwargs):
+        """
+        Call func once the governor allows a request with the given priority
+        """
+        self.acquire(priority, self.max_wait(priority))
+        try:
+            return func(*args, **kwargs)
+        except spotipy.exceptions.SpotifyException as e:
+            self.check_rate_limit(e)
+            raise
+
+    def check_rate_limit(self, error: spotipy.exceptions.SpotifyException) -> None:
+        """
+        Back off if the error is a rate limit response
+        """
+        if error.http_status == 429:
+            self.back_off(int((error.headers or {}).get('Retry-After', 1)))
+
+    def max_wait(self, priority: int) -> float:
+        return COMMAND_MAX_WAIT if priority == PRIORITY_COMMAND else None
+
+    def acquire(self, priority: int, max_wait: float = None) -> None:
+        """
+        Wait until a request with the given priority may be sent
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        throttled = False
+
+        with self.condition:
+            if priority == PRIORITY_COMMAND:
+                self.waiting_commands += 1
+            try:
+                while True:
+                    wait = self.take_token(priority)
+                    if not wait:
+                        return
+                    if not throttled:
+                        throttled = True
+                        self.throttled += 1
+                    self.check_deadline(deadline, wait)
+                    self.condition.wait(wait)
+            finally:
+                if priority == PRIORITY_COMMAND:
+                    self.waiting_commands -= 1
+                    self.condition.notify_all()
+
+    async def acquire_async(self, priority: int, max_wait: float = None) -> None:
+        """
+        Like acquire, but waits on the event loop instead of blocking the thread
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        throttled = False
+
+        while True:
+            with self.condition:
+                wait = self.take_token(priority)
+                if not wait:
+                    return
+                if not throttled:
+                    throttled = True
+                    self.throttled += 1
+                self.check_deadline(deadline, wait)
+            await asyncio.sleep(wait)
+
+    def take_token(self, priority: int) -> float:
+        """
+        Take a token if a request with the given priority may be sent now.
+        Returns 0 if it may, otherwise the seconds to wait for the next try.
+        Called with the condition held.
+        """
+        now = time.monotonic()
+        self.refill(now)
+        # Polls leave the reserved tokens to the commands
+        needed = 1 if priority == PRIORITY_COMMAND else 1 + COMMAND_RESERVE
+        if (now >= self.blocked_until and self.tokens >= needed
+                and (priority == PRIORITY_COMMAND or self.waiting_commands == 0)):
+            self.tokens -= 1
+            self.requests += 1
+            return 0.0
+        return max(self.blocked_until - now, (needed - self.tokens) / BUCKET_RATE, 0.05)
+
+    def check_deadline(self, deadline: float, wait: float) -> None:
+        """
+        Fail if the request would have to wait past its deadline
+        """
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.rejected += 1
+            raise RateLimitedError("Request rate limit reached")
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(BUCKET_SIZE, self.tokens + (now - self.last_refill) * BUCKET_RATE)
+        self.last_refill = now
+
+    def back_off(self, retry_after: int) -> None:
+        """
+        Block all requests for retry_after seconds
+        """
+        log.error("Spotify API rate limit exceeded. Back off for {}s", retry_after)
+        with self.condition:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.condition.notify_all()
+
+    def get_stats(self) -> dict:
+        """
+        Get the request counters of the governor
+        """
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+            "tokens": round(self.tokens, 2),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+        }
@@ -0,0 +1,19 @@
+import rpyc
+
+def async_func(func):
+    """
+    Get a wrapper of a function of the plugin that calls it over RPC without
+    waiting for its result. Functions that are no RPC proxies, e.g. of the
+    local frontend of the benchmark, are returned as they are.
+    """
+    try:
+        return rpyc.async_(func)
+    except TypeError:
+        return func
+
+def call_async(func, *args) -> None:
+    """
+    Call a function of the plugin over RPC without waiting for its result,
+    so a slow or idle plugin does not block the calling backend thread
+    """
+    async_func(func)(*args)
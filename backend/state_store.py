@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+from device_index import DeviceIndex
+from playback_model import PlaybackState
+
+# Number of states kept for diffing
+STATE_HISTORY = 16
+
+class BackendState:
+    """
+    Immutable playback and device state of the backend. A new state is
+    built for every poll or patch, the contained responses are never changed.
+    """
+    __slots__ = ("version", "playback", "polled_playback", "devices", "device_index")
+
+    def __init__(self, version: int = 0, playback: PlaybackState = None, polled_playback: PlaybackState = None,
+                 devices: list = None, device_index: DeviceIndex = None):
+        object.__setattr__(self, "version", version)
+        # Polled playback with the pending optimistic values applied
+        object.__setattr__(self, "playback", playback)
+        object.__setattr__(self, "polled_playback", polled_playback)
+        object.__setattr__(self, "devices", devices)
+        object.__setattr__(self, "device_index", device_index or DeviceIndex())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BackendState is immutable")
+
+    def replace(self, **changes) -> "BackendState":
+        """
+        Get a copy of the state with the given fields changed and the next version
+        """
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        fields["version"] = self.version + 1
+        return BackendState(**fields)
+
+    def get_active_device_id(self) -> str:
+        return self.device_index.get_active_device_id()
+
+    def diff(self, other: "BackendState") -> tuple:
+        """
+        Get the playback fields that differ from the other state,
+        "playback" if only one of them has a playback and "devices"
+        if the device list changed
+        """
+        previous = other.playback if other is not None else None
+        if self.playback is None:
+            changed = () if previous is None else ("playback",)
+        elif previous is None:
+            changed = ("playback",)
+        else:
+            changed = self.playback.diff(previous)
+        if other is None or self.devices != other.devices:
+            changed += ("devices",)
+        return changed
+
+class StateStore:
+    """
+    Holds the current BackendState. Writers swap in a new state under a lock,
+    readers take the current state once without locking and get a
+    consistent view of playback and devices.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = BackendState()
+        self.history = deque([self.state], maxlen=STATE_HISTORY)
+
+    def get(self) -> BackendState:
+        return self.state
+
+    def get_history(self) -> list:
+        """
+        Get the last states, oldest first
+        """
+        with self.lock:
+            return list(self.history)
+
+    def update(self, func) -> BackendState:
+        """
+        Swap in the state returned by func(current state). func runs under
+        the lock, so concurrent updates never overwrite each other.
+        It returns None to keep the current state.
+        """
+        with self.lock:
+            state = func(self.state)
+            if state is not None:
+                self.state = state
+                self.history.append(state)
+            return self.state
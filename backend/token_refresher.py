@@ -0,0 +1,99 @@
+import json, os, tempfile, threading, time
+import spotipy
+from log_utils import log
+
+# Seconds before expiry at which the token is refreshed in the background.
+# Larger than the margin of spotipy, so a Web API call never refreshes lazily.
+REFRESH_MARGIN = 300
+# Seconds until a failed refresh is retried
+REFRESH_RETRY_INTERVAL = 15
+
+class AtomicCacheFileHandler(spotipy.cache_handler.CacheFileHandler):
+    """
+    Token cache file that is replaced atomically. Readers always get either
+    the old or the new token, never a partly written file.
+    """
+
+    def save_token_to_cache(self, token_info):
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        try:
+            # mkstemp creates the file readable by the user only
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cache-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(json.dumps(token_info, cls=self.encoder_cls))
+                os.replace(tmp_path, self.cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            log.warning("Couldn't write token to cache at {}: {}", self.cache_path, e)
+
+class TokenRefresher:
+    """
+    Refreshes the token on a worker thread REFRESH_MARGIN seconds before it
+    expires. The old token is used until the new one is stored.
+    """
+
+    def __init__(self, refresh):
+        # Refreshes the token and returns its new expiry time, None if there is no token
+        self.refresh = refresh
+        self.expires_at = 0.0
+        self.retry_at = 0.0
+        self.wake_event = threading.Event()
+        self.worker = threading.Thread(target=self.run, name="token_refresher")
+        self.worker.daemon = True
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def schedule(self, expires_at: float) -> None:
+        """
+        Refresh the token with the given expiry time ahead of time
+        """
+        if expires_at == self.expires_at:
+            return
+        self.expires_at = expires_at
+        self.retry_at = 0.0
+        self.wake_event.set()
+
+    def next_refresh(self) -> float:
+        """
+        Get the time of the next refresh, None if no token is known
+        """
+        if not self.expires_at:
+            return None
+        return max(self.expires_at - REFRESH_MARGIN, self.retry_at)
+
+    def run(self) -> None:
+        while True:
+            refresh_at = self.next_refresh()
+            delay = None if refresh_at is None else refresh_at - time.time()
+            if delay is None or delay > 0:
+                self.wake_event.wait(delay)
+                self.wake_event.clear()
+                continue
+
+            log.debug("Refresh token ahead of expiry")
+            try:
+                self.refresh_done(self.refresh())
+            except Exception as e:
+                log.error("Token refresh failed: {}", e)
+                self.refresh_failed()
+
+    def refresh_done(self, expires_at: float) -> None:
+        """
+        Schedule the refresh of the new token
+        """
+        self.expires_at = expires_at or 0.0
+        self.retry_at = 0.0
+
+    def refresh_failed(self) -> None:
+        """
+        Retry a failed refresh while the token is still valid
+        """
+        if time.time() + REFRESH_RETRY_INTERVAL < self.expires_at:
+            self.retry_at = time.time() + REFRESH_RETRY_INTERVAL
+        else:
+            # Expires before the retry, spotipy refreshes it on the next call
+            self.expires_at = 0.0
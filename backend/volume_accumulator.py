@@ -0,0 +1,88 @@
+import threading, time
+
+# Seconds to wait for more volume key presses before the volume is sent
+VOLUME_DEBOUNCE = 0.3
+# Seconds the local volume is kept after sending if no poll confirms it
+RECONCILE_TIMEOUT = 3.0
+
+class VolumeAccumulator:
+    """
+    Collects volume changes per device, applies them locally at once and
+    sends only the final absolute volume after a short debounce window.
+    """
+
+    def __init__(self, send):
+        # send(volume, device_id, callback) sends the absolute volume
+        self.send = send
+        self.lock = threading.Lock()
+        self.local_volume = {}
+        self.sent_at = {}
+        self.timers = {}
+        self.callbacks = {}
+
+    def adjust(self, device_id: str, base_volume: int, delta: int, callback=None) -> int:
+        """
+        Apply a volume change locally and (re)start the debounce timer.
+        base_volume is used if there is no local volume for the device yet.
+        """
+        with self.lock:
+            volume = self.local_volume.get(device_id, base_volume)
+            volume = max(0, min(100, int(volume + delta)))
+            self.local_volume[device_id] = volume
+            self.sent_at.pop(device_id, None)
+            self.callbacks[device_id] = callback
+
+            if device_id in self.timers:
+                self.timers[device_id].cancel()
+            timer = threading.Timer(VOLUME_DEBOUNCE, self.flush, args=(device_id,))
+            timer.daemon = True
+            self.timers[device_id] = timer
+            timer.start()
+        return volume
+
+    def flush(self, device_id: str) -> None:
+        """
+        Send the accumulated volume of the device
+        """
+        with self.lock:
+            self.timers.pop(device_id, None)
+            volume = self.local_volume.get(device_id)
+            callback = self.callbacks.pop(device_id, None)
+            if volume is None:
+                return
+            self.sent_at[device_id] = time.monotonic()
+        self.send(volume, device_id, callback)
+
+    def hold(self, device_id: str, volume: int) -> None:
+        """
+        Keep an already sent volume locally until a poll confirms it
+        """
+        with self.lock:
+            self.local_volume[device_id] = volume
+            self.sent_at[device_id] = time.monotonic()
+
+    def drop(self, device_id: str) -> None:
+        """
+        Drop the local volume of the device, e.g. if sending it failed
+        """
+        with self.lock:
+            self.local_volume.pop(device_id, None)
+            self.sent_at.pop(device_id, None)
+
+    def get(self, device_id: str) -> int:
+        """
+        Get the local volume of the device or None if there is none
+        """
+        return self.local_volume.get(device_id)
+
+    def reconcile(self, device_id: str, polled_volume: int) -> None:
+        """
+        Drop the local volume once a poll confirmed it or it timed out
+        """
+        with self.lock:
+            if device_id not in self.sent_at:
+                return
+            if (polled_volume == self.local_volume.get(device_id)
+                    or time.monotonic() - self.sent_at[device_id] > RECONCILE_TIMEOUT):
+                self.local_volume.pop(device_id, None)
+                self.sent_at.pop(device_id, None)
@@ -0,0 +1,270 @@
+"""
+Benchmarks for the SpotifyControl backend.
+
+Drives SpotifyControlBackend headless against the fake Web API from
+backend/fake_webapi.py and prints the results as JSON:
+
+    python benchmarks/bench_backend.py --output bench.json
+
+Measured are the time per poll cycle of the ticked API call, the latency
+from a key press to the command being sent for each action class, the
+RPC calls per simulated deck tick and the Web API calls per minute while
+paused and while playing. The metrics of the backend are included.
+"""
+import argparse, importlib.machinery, importlib.util, json, logging, math, os, statistics, sys, tempfile, threading, time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, ROOT)
+
+from loguru import logger as log
+from fake_webapi import FakeWebApi
+from headless import load_backend_module, create_backend
+from request_governor import BUCKET_RATE
+from poll_scheduler import BOOST_DURATION
+
+
+def import_plugin_module(name: str):
+    """
+    Import a module of the plugin, which uses package relative imports
+    """
+    if "spotify_control" not in sys.modules:
+        spec = importlib.machinery.ModuleSpec("spotify_control", None, is_package=True)
+        spec.submodule_search_locations = [ROOT]
+        sys.modules["spotify_control"] = importlib.util.module_from_spec(spec)
+    return importlib.import_module("spotify_control." + name)
+
+
+SnapshotCache = import_plugin_module("snapshot").SnapshotCache
+Heartbeat = import_plugin_module("heartbeat").Heartbeat
+
+# Commands sent by the key press of each action class
+ACTION_COMMANDS = {
+    "PlayPauseAction": ("play", lambda device_id: (device_id,)),
+    "NextTrackAction": ("next_track", lambda device_id: (device_id,)),
+    "PrevTrackAction": ("previous_track", lambda device_id: (device_id,)),
+    "ShuffleAction": ("shuffle", lambda device_id: (True, device_id)),
+    "RepeatAction": ("repeat", lambda device_id: ("context", device_id)),
+    "VolMuteAction": ("set_volume", lambda device_id: (0, device_id)),
+    "VolSetAction": ("set_volume", lambda device_id: (50, device_id)),
+    "VolUpAction": ("adjust_volume", lambda device_id: (5, device_id)),
+    "VolDwnAction": ("adjust_volume", lambda device_id: (-5, device_id)),
+}
+
+
+class CountingFrontend:
+    """
+    Stands in for the plugin the backend pushes state changes to
+    """
+
+    def __init__(self):
+        self.cache = SnapshotCache()
+        self.pushes = 0
+
+    def on_state_changed(self, version: int, changed: tuple) -> None:
+        self.pushes += 1
+        self.cache.on_state_changed(version, changed)
+
+
+class CountingBackend:
+    """
+    Counts the RPC calls the plugin makes into the backend
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+def fake_stats(fake: FakeWebApi) -> dict:
+    with urllib.request.urlopen("http://127.0.0.1:" + str(fake.port) + "/fake/stats") as response:
+        return json.loads(response.read())
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[max(0, math.ceil(len(samples) * 0.95) - 1)] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def bench_poll_cycle(backend, cycles: int) -> dict:
+    """
+    Time per poll cycle of the ticked API call
+    """
+    samples = []
+    for _ in range(cycles):
+        start = time.perf_counter()
+        backend.poll()
+        samples.append(time.perf_counter() - start)
+        # Stay below the request rate so the governor does not add waits
+        time.sleep(1 / BUCKET_RATE)
+    return summarize(samples)
+
+
+def bench_key_press(backend, presses: int) -> dict:
+    """
+    Latency from key press to the queued command returning (what blocks the
+    key handler) and to the command being sent and acknowledged
+    """
+    device_id = backend.get_active_device_id()
+    results = {}
+    for action, (command, make_args) in ACTION_COMMANDS.items():
+        enqueue_samples = []
+        sent_samples = []
+        for _ in range(presses):
+            done = threading.Event()
+            start = time.perf_counter()
+            sent = []
+
+            def on_command_done(success: bool):
+                sent.append(time.perf_counter())
+                done.set()
+
+            if command == "adjust_volume":
+                backend.adjust_volume(*make_args(device_id), callback=on_command_done)
+            else:
+                backend.enqueue_command(command, make_args(device_id), on_command_done)
+            enqueue_samples.append(time.perf_counter() - start)
+            if not done.wait(10):
+                raise RuntimeError(action + " command was not sent")
+            sent_samples.append(sent[0] - start)
+            time.sleep(1 / BUCKET_RATE)
+        results[action] = {
+            "command": command,
+            "key_down": summarize(enqueue_samples),
+            "command_sent": summarize(sent_samples),
+        }
+    return results
+
+
+def bench_deck_tick(backend, keys: int, ticks: int, tick_interval: float) -> dict:
+    """
+    RPC calls into the backend per simulated deck tick, with every key
+    sending the heartbeat and reading the shared snapshot like the actions do
+    """
+    rpc = CountingBackend(backend)
+    cache = backend.frontend.cache
+    heartbeat = Heartbeat()
+    for _ in range(ticks):
+        for _ in range(keys):
+            heartbeat.beat(rpc)
+            cache.get(rpc)
+        time.sleep(tick_interval)
+    return {
+        "keys": keys,
+        "ticks": ticks,
+        "rpc_calls": rpc.calls,
+        "rpc_calls_per_tick": round(rpc.calls / ticks, 3),
+    }
+
+
+def bench_api_rate(backend, fake: FakeWebApi, playing: bool, window: float) -> dict:
+    """
+    Web API calls per minute of the ticked API call with an active deck
+    """
+    command = "play" if playing else "pause"
+    # A new backend knows no active device until it polled once
+    backend.set_action_active(True)
+    backend.poll()
+    results = []
+    backend.enqueue_command(command, (None,), results.append)
+    deadline = time.monotonic() + 5
+    while not results and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if results != [True] or fake.is_playing != playing:
+        raise RuntimeError("Could not {} the fake Web API before counting its calls".format(command))
+    # Not counting the fast polls right after the command
+    time.sleep(BOOST_DURATION + 1)
+
+    before = fake_stats(fake)
+    end = time.monotonic() + window
+    while time.monotonic() < end:
+        backend.set_action_active(True)
+        time.sleep(0.5)
+    after = fake_stats(fake)
+
+    endpoints = {endpoint: count - before["endpoints"].get(endpoint, 0)
+                 for endpoint, count in after["endpoints"].items()
+                 if count - before["endpoints"].get(endpoint, 0) > 0}
+    calls = after["requests"] - before["requests"]
+    return {
+        "window_s": window,
+        "api_calls": calls,
+        "api_calls_per_minute": round(calls * 60 / window, 2),
+        "endpoints": endpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SpotifyControl backend")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Seconds the fake Web API delays every request")
+    parser.add_argument("--devices", type=int, default=3)
+    parser.add_argument("--cycles", type=int, default=20, help="Poll cycles to time")
+    parser.add_argument("--presses", type=int, default=3, help="Key presses per action class")
+    parser.add_argument("--keys", type=int, default=10, help="Keys of the simulated deck")
+    parser.add_argument("--ticks", type=int, default=10, help="Simulated deck ticks")
+    parser.add_argument("--tick-interval", type=float, default=1.0,
+                        help="Seconds between two deck ticks")
+    parser.add_argument("--window", type=float, default=20.0,
+                        help="Seconds to count API calls while paused and while playing")
+    parser.add_argument("--output", help="Write the results to this file instead of stdout")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    fake = FakeWebApi(0, args.devices, args.latency)
+    fake.start()
+    cache_dir = tempfile.mkdtemp(prefix="spotify-control-bench-")
+    module = load_backend_module(fake, os.path.join(cache_dir, ".cache"))
+    log.remove()
+    log.add(sys.stderr, level="WARNING")
+
+    results = {
+        "config": vars(args),
+        "timestamp": time.time(),
+    }
+
+    backend = create_backend(module, CountingFrontend(), run_poller=False)
+    results["poll_cycle"] = bench_poll_cycle(backend, args.cycles)
+    results["key_press"] = bench_key_press(backend, args.presses)
+    time.sleep(1)
+    backend.poll()
+    results["deck_tick"] = bench_deck_tick(backend, args.keys, args.ticks, args.tick_interval)
+
+    backend = create_backend(module, CountingFrontend(), run_poller=True)
+    results["api_rate"] = {
+        "paused": bench_api_rate(backend, fake, False, args.window),
+        "playing": bench_api_rate(backend, fake, True, args.window),
+    }
+    results["request_governor"] = json.loads(backend.get_request_stats())
+    results["metrics"] = json.loads(backend.get_metrics())
+    fake.stop()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
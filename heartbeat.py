@@ -0,0 +1,22 @@
+import time
+
+# Seconds between two keep-alive calls to the backend. Must stay below
+# ACTIVE_TIMEOUT of the backend, after which it stops polling.
+HEARTBEAT_INTERVAL = 2.0
+
+class Heartbeat:
+    """
+    Tells the backend that Spotify keys are visible. Called by every key
+    on every tick but sends at most one RPC per interval for the plugin.
+    """
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.last_beat = 0.0
+
+    def beat(self, backend) -> None:
+        now = time.monotonic()
+        if now - self.last_beat < self.interval:
+            return
+        self.last_beat = now
+        backend.set_action_active(True)
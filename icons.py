@@ -0,0 +1,26 @@
+import os
+
+from PIL import Image
+
+from .backend.log_utils import log
+
+class IconCache:
+    """
+    Decoded icons of the assets folder, loaded once at plugin start.
+    Actions push these images instead of a path the host decodes again.
+    """
+
+    def __init__(self, assets_path: str):
+        self.icons = {}
+        for file_name in sorted(os.listdir(assets_path)):
+            if not file_name.endswith(".png"):
+                continue
+            with Image.open(os.path.join(assets_path, file_name)) as image:
+                self.icons[file_name] = image.convert("RGBA")
+        log.debug("Loaded {} icons", len(self.icons))
+
+    def get(self, name: str) -> Image.Image:
+        """
+        Get a copy of the decoded icon so the host can not change the cached one
+        """
+        return self.icons[name].copy()
@@ -1,5 +1,7 @@
 import os
 
+from gi.repository import GLib
+
 # Import StreamController modules
 from src.backend.PluginManager.PluginBase import PluginBase
 from src.backend.PluginManager.ActionHolder import ActionHolder
@@ -16,6 +18,10 @@ from .actions.repeat import RepeatAction
 from .actions.vol_set import VolSetAction
 
 from .settings import PluginSettings
+from .snapshot import SpotifySnapshot, SnapshotCache
+from .icons import IconCache
+from .heartbeat import Heartbeat
+from .backend.log_utils import log
 
 class SpotifyControl(PluginBase):
     def __init__(self):
@@ -24,6 +30,11 @@ class SpotifyControl(PluginBase):
         self.lm = self.locale_manager
         self.lm.set_to_os_default()
 
+        self._snapshot_cache = SnapshotCache()
+        self._heartbeat = Heartbeat()
+        self._devices_listener = None
+        self.icons = IconCache(os.path.join(self.PATH, "assets"))
+
         ## Launch backend
         backend_path = os.path.join(self.PATH, "backend", "backend.py")
         self.launch_backend(backend_path=backend_path, open_in_terminal=False,
@@ -114,5 +125,79 @@ class SpotifyControl(PluginBase):
 
         self.has_plugin_settings = True
 
+    def on_state_changed(self, version: int, changed: tuple) -> None:
+        """
+        Called by the backend when a new snapshot version is available
+        """
+        self._snapshot_cache.on_state_changed(version, changed)
+        if "devices" in changed and self._devices_listener is not None:
+            # Called on the RPC thread, the listener updates GTK widgets
+            GLib.idle_add(self._devices_listener)
+
+    def get_snapshot(self) -> SpotifySnapshot:
+        """
+        Get the latest backend state snapshot shared by all actions
+        """
+        return self._snapshot_cache.get(self.backend)
+
+    def set_devices_listener(self, callback) -> None:
+        """
+        Call callback in the GTK main loop when the device list changed,
+        e.g. to update the device selector of an open config UI
+        """
+        self._devices_listener = callback
+
+    def clear_devices_listener(self, callback) -> None:
+        """
+        Stop calling callback on device list changes,
+        unless another listener was set in the meantime
+        """
+        if self._devices_listener == callback:
+            self._devices_listener = None
+
+    def keep_alive(self) -> None:
+        """
+        Keep the backend polling while Spotify keys are shown
+        """
+        self._heartbeat.beat(self.backend)
+
+    def has_state_changed(self, keys: tuple, since_version: int) -> bool:
+        """
+        Check if one of the snapshot keys changed after the given version
+        """
+        return self._snapshot_cache.has_state_changed(keys, since_version)
+
+    def send_command(self, action, command: str, *args) -> None:
+        """
+        Queue a player command in the backend without waiting for the Web API.
+        The key of the action shows an error if the command failed.
+        """
+        self.backend.enqueue_command(command, args, self.command_callback(action))
+
+    def adjust_volume(self, action, delta: int, device_id=None) -> None:
+        """
+        Change the volume by delta. Rapid changes are collected by the backend
+        and sent as one command.
+        """
+        self.backend.adjust_volume(delta, device_id, self.command_callback(action))
+
+    def command_callback(self, action):
+        """
+        Get a callback that shows an error on the key of the action
+        if its command failed
+        """
+        def on_command_done(success: bool):
+            if not success:
+                action.show_error(duration=1)
+        return on_command_done
+
+    def set_log_level(self, level: str) -> bool:
+        """
+        Set the log level of the plugin and the backend at runtime
+        """
+        if not log.set_level(level):
+            return False
+        return self.backend.set_log_level(level)
+
     def get_settings_area(self):
         return self._settings_manager.get_settings_area()
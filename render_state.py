@@ -0,0 +1,37 @@
+class RenderState:
+    """
+    Icon and labels last pushed to the key of an action.
+    Updates that match them are skipped, so the host only redraws
+    the key and sends it to the deck when something changed.
+    """
+
+    def __init__(self, action, icons):
+        self.action = action
+        self.icons = icons
+        self.icon = None
+        self.labels = {}
+
+    def reset(self) -> None:
+        """
+        Forget the pushed state, e.g. when the key was shown again
+        """
+        self.icon = None
+        self.labels = {}
+
+    def set_icon(self, icon: str, size: float = 0.75) -> None:
+        """
+        Push an icon of the icon cache if it is not shown already
+        """
+        if (icon, size) == self.icon:
+            return
+        self.icon = (icon, size)
+        self.action.set_media(image=self.icons.get(icon), size=size)
+
+    def set_label(self, position: str, text: str) -> None:
+        """
+        Push the label at position (top, center or bottom) if it changed
+        """
+        if self.labels.get(position) == text:
+            return
+        self.labels[position] = text
+        getattr(self.action, "set_" + position + "_label")(text)
@@ -0,0 +1,127 @@
+import json
+import time
+
+from .backend.playback_model import SNAPSHOT_KEYS
+
+# Refetch the snapshot after this many seconds even without a pushed change,
+# in case a push got lost
+SNAPSHOT_MAX_AGE = 10.0
+
+
+class SpotifySnapshot:
+    """
+    Immutable local copy of the backend state.
+    Actions read from this instead of calling the backend getters one by one.
+    """
+    __slots__ = ("version",) + SNAPSHOT_KEYS
+
+    def __init__(self, version: int = -1, authed: bool = False, active_device: dict = None,
+                 devices: list = None, is_playing: bool = None, shuffle_state: bool = None,
+                 repeat_state: str = None, volume_percent: int = None, device_volumes: dict = None):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "authed", authed)
+        object.__setattr__(self, "active_device", active_device)
+        object.__setattr__(self, "devices", tuple(devices or ()))
+        object.__setattr__(self, "is_playing", is_playing)
+        object.__setattr__(self, "shuffle_state", shuffle_state)
+        object.__setattr__(self, "repeat_state", repeat_state)
+        object.__setattr__(self, "volume_percent", volume_percent)
+        object.__setattr__(self, "device_volumes", device_volumes or {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SpotifySnapshot is immutable")
+
+    @classmethod
+    def from_json(cls, payload: str) -> "SpotifySnapshot":
+        """
+        Create a snapshot from the serialized backend snapshot
+        """
+        if not payload:
+            return cls()
+        return cls(**json.loads(payload))
+
+    def diff(self, other: "SpotifySnapshot") -> tuple:
+        """
+        Get the keys that differ from the other snapshot
+        """
+        if other is None:
+            return SNAPSHOT_KEYS
+        return tuple(key for key in SNAPSHOT_KEYS if getattr(self, key) != getattr(other, key))
+
+    def is_authed(self) -> bool:
+        return self.authed
+
+    def get_devices(self) -> tuple:
+        return self.devices
+
+    def get_active_device_id(self) -> str:
+        if self.active_device is None:
+            return None
+        return self.active_device["id"]
+
+    def get_active_device_name(self) -> str:
+        if self.active_device is None:
+            return None
+        return self.active_device["name"]
+
+    def get_playback_state(self) -> bool:
+        return self.is_playing
+
+    def get_shuffle_mode(self) -> bool:
+        return self.shuffle_state
+
+    def get_current_repeat_state(self) -> str:
+        return self.repeat_state
+
+    def get_volume(self, device_id) -> int:
+        """
+        Get the volume of the device or of the active device if device_id is None.
+        None if the device does not support volume control.
+        """
+        if device_id is None:
+            return self.volume_percent
+        return self.device_volumes.get(device_id)
+
+
+class SnapshotCache:
+    """
+    Latest snapshot of the plugin and the versions its keys changed in.
+    The backend is only asked again after it pushed a change.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.snapshot_time = 0.0
+        self.latest_version = -1
+        self.changed_versions = {}
+
+    def on_state_changed(self, version: int, changed: tuple) -> None:
+        """
+        Remember the keys the backend pushed as changed
+        """
+        for key in changed:
+            self.changed_versions[key] = version
+        self.latest_version = max(self.latest_version, version)
+
+    def get(self, backend) -> SpotifySnapshot:
+        """
+        Get the latest snapshot, fetching it from the backend if needed
+        """
+        now = time.monotonic()
+        if (self.snapshot is None or self.snapshot.version < self.latest_version
+                or now - self.snapshot_time >= SNAPSHOT_MAX_AGE):
+            snapshot = SpotifySnapshot.from_json(backend.get_snapshot())
+            for key in snapshot.diff(self.snapshot):
+                self.changed_versions[key] = max(self.changed_versions.get(key, -1), snapshot.version)
+            self.latest_version = max(self.latest_version, snapshot.version)
+            self.snapshot = snapshot
+            self.snapshot_time = now
+        return self.snapshot
+
+    def has_state_changed(self, keys: tuple, since_version: int) -> bool:
+        """
+        Check if one of the keys changed after the given version
+        """
+        if since_version is None:
+            return True
+        return any(self.changed_versions.get(key, -1) > since_version for key in keys)
@@ -0,0 +1,131 @@
+"""
+Behavior tests of the backend against the fake Web API from backend/fake_webapi.py
+"""
+import json, logging, os, sys, time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from fake_webapi import FakeWebApi
+from headless import load_backend_module, create_backend
+from volume_accumulator import VOLUME_DEBOUNCE
+
+
+@pytest.fixture
+def fake():
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    fake = FakeWebApi(0, 3)
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def backend(fake, tmp_path):
+    module = load_backend_module(fake, str(tmp_path / ".cache"))
+    backend = create_backend(module)
+    backend.poll()
+    return backend
+
+
+def snapshot(backend) -> dict:
+    return json.loads(backend.get_snapshot())
+
+
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_rate_limit_backs_off_for_retry_after(backend, fake):
+    fake.rate_limit_every = 1
+    fake.retry_after = 1
+    backend.poll()
+    stats = backend.governor.get_stats()
+    assert stats["rate_limited"] == 1
+    assert stats["blocked_for"] > 0.5
+
+    fake.rate_limit_every = 0
+    start = time.monotonic()
+    backend.poll()
+    assert time.monotonic() - start >= 0.5
+    assert backend.get_active_device_id() == fake.devices[0]["id"]
+
+
+def test_unauthorized_poll_reauthenticates(backend, fake):
+    fake.unauthorized = 1
+    backend.poll()
+    assert backend.get_active_device_id() is None
+
+    backend.poll_scheduler.request_devices()
+    backend.poll()
+    assert backend.is_authed()
+    assert backend.get_active_device_id() == fake.devices[0]["id"]
+
+
+def test_failed_command_rolls_back_optimistic_patch(backend, fake):
+    results = []
+    fake.unauthorized = 1
+    backend.enqueue_command("shuffle", (True, None), results.append)
+    assert snapshot(backend)["shuffle_state"] is True
+
+    assert wait_for(lambda: results)
+    assert results == [False]
+    assert snapshot(backend)["shuffle_state"] is False
+    assert fake.shuffle_state is False
+
+
+def test_invalid_command_value_is_not_patched(backend):
+    results = []
+    backend.enqueue_command("repeat", ("bogus", None), results.append)
+    assert snapshot(backend)["repeat_state"] == "off"
+    assert wait_for(lambda: results)
+    assert results == [False]
+
+
+def test_volume_changes_are_coalesced_into_one_request(backend, fake):
+    device_id = fake.devices[0]["id"]
+    for _ in range(5):
+        backend.adjust_volume(5, device_id)
+    assert backend.get_volume(device_id) == 75
+
+    assert wait_for(lambda: fake.devices[0]["volume_percent"] == 75, VOLUME_DEBOUNCE + 2)
+    time.sleep(VOLUME_DEBOUNCE)
+    assert fake.stats.get("PUT /v1/me/player/volume") == 1
+
+
+def test_volume_is_tracked_per_device(backend, fake):
+    fake.devices[1]["supports_volume"] = False
+    fake.devices[2]["volume_percent"] = 20
+    backend.poll_scheduler.request_devices()
+    backend.poll()
+    ids = [device["id"] for device in fake.devices]
+
+    assert [backend.get_volume(device_id) for device_id in ids] == [50, None, 20]
+    assert backend.get_volume(None) == 50
+    assert snapshot(backend)["device_volumes"] == {ids[0]: 50, ids[1]: None, ids[2]: 20}
+
+    backend.adjust_volume(5, ids[2])
+    assert backend.get_volume(ids[2]) == 25
+    assert backend.get_volume(ids[0]) == 50
+    assert wait_for(lambda: fake.devices[2]["volume_percent"] == 25, VOLUME_DEBOUNCE + 2)
+    assert fake.devices[0]["volume_percent"] == 50
+
+
+def test_unchanged_devices_are_not_parsed_again(backend, fake):
+    devices = backend.state_store.get().devices
+    backend.poll_scheduler.request_devices()
+    backend.poll()
+    assert backend.state_store.get().devices is devices
+    counters = json.loads(backend.get_metrics())["counters"]
+    assert {"cache": "etag", "result": "hit"} in [counter["labels"] for counter in counters]
+
+    fake.devices[1]["name"] = "Renamed"
+    backend.poll_scheduler.request_devices()
+    backend.poll()
+    assert [device.name for device in backend.state_store.get().devices][1] == "Renamed"